@@ -1,9 +1,13 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import logging
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost/legalplates")
@@ -34,6 +38,75 @@ def get_db():
         db.close()
 
 
+# HNSW build parameters by expected template count: (upper bound, m, ef_construction)
+HNSW_BUILD_PARAMS = [
+    (100_000, 16, 64),
+    (1_000_000, 24, 100),
+    (float("inf"), 32, 128),
+]
+
+
+def hnsw_build_params(vector_count: int):
+    """(m, ef_construction) for an HNSW index over vector_count embeddings."""
+    for upper_bound, m, ef_construction in HNSW_BUILD_PARAMS:
+        if vector_count < upper_bound:
+            return m, ef_construction
+
+
+def template_embedding_index_ddl(vector_count: int = 0, halfvec: bool = False, inner_product: bool = False):
+    """
+    CREATE INDEX statement for the HNSW index on template embeddings (pgvector >= 0.5.0),
+    so similarity search doesn't scan every embedding.
+    
+    Only takes effect when the index doesn't exist yet; an existing index keeps the
+    parameters it was built with until it is dropped.
+    """
+    m, ef_construction = hnsw_build_params(vector_count)
+    metric, suffix = ("ip", "_ip") if inner_product else ("cosine", "")
+    if halfvec:
+        target = f"ix_template_embedding_halfvec{suffix}_hnsw ON template USING hnsw ((embedding::halfvec(384)) halfvec_{metric}_ops)"
+    else:
+        target = f"ix_template_embedding{suffix}_hnsw ON template USING hnsw (embedding vector_{metric}_ops)"
+    return text(f"CREATE INDEX IF NOT EXISTS {target} WITH (m = {m}, ef_construction = {ef_construction})")
+
+
+# Opt-in: index (and search) embeddings as FP16 halfvec, halving the HNSW index size and
+# the bytes read per distance. The column stays FP32. Needs pgvector >= 0.7.0.
+EMBEDDING_HALFVEC_INDEX = os.getenv("EMBEDDING_HALFVEC_INDEX", "false").lower() == "true"
+
+# Opt-in: index and rank by inner product (vector_ip_ops) instead of cosine. Embeddings
+# are stored unit-normalized, where the two agree, and the inner product skips the two
+# norms per comparison. Builds a separate index; drop the cosine one once switched.
+EMBEDDING_INNER_PRODUCT = os.getenv("EMBEDDING_INNER_PRODUCT", "false").lower() == "true"
+
+
+# Columns added after the first release; create_all only creates missing tables
+TEMPLATE_COLUMN_DDL = [
+    text("ALTER TABLE template ADD COLUMN IF NOT EXISTS source_sha256 VARCHAR(64)"),
+    text("CREATE INDEX IF NOT EXISTS ix_template_source_sha256 ON template (source_sha256)"),
+]
+
+
 def init_db():
     from app.models import Template, TemplateVariable, Instance, Document
     Base.metadata.create_all(bind=engine, tables=[Template.__table__, TemplateVariable.__table__, Instance.__table__, Document.__table__])
+    
+    with engine.begin() as conn:
+        for ddl in TEMPLATE_COLUMN_DDL:
+            conn.execute(ddl)
+    
+    try:
+        with engine.begin() as conn:
+            # Sized for the templates already stored when the index is first built
+            vector_count = conn.execute(text("SELECT count(*) FROM template WHERE embedding IS NOT NULL")).scalar() or 0
+            conn.execute(template_embedding_index_ddl(
+                vector_count, halfvec=EMBEDDING_HALFVEC_INDEX, inner_product=EMBEDDING_INNER_PRODUCT
+            ))
+    except SQLAlchemyError as e:
+        # Older pgvector without HNSW - similarity search falls back to a sequential scan
+        logger.warning(f"Could not create HNSW index on template embeddings: {e}")
+        return
+    
+    from app.services.template_generator import configure_hnsw_ef_search
+    ef_search = configure_hnsw_ef_search(vector_count)
+    logger.info(f"HNSW similarity search over {vector_count} embeddings, ef_search={ef_search}")
@@ -17,6 +17,12 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+try:
+    import orjson  # noqa: F401 - ORJSONResponse needs it at render time
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -32,7 +38,8 @@ app = FastAPI(
     lifespan=lifespan,
     title="LegalPlates API",
     description="API for legal document template generation and management",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponse
 )
 
 # Exception handler for standardized error responses
@@ -43,7 +50,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     the standardized response format: {error, message, body}
     """
     logger.warning(f"HTTP {exc.status_code}: {exc.detail} - Path: {request.url.path}")
-    return JSONResponse(
+    return DefaultResponse(
         status_code=exc.status_code,
         content={
             "error": True,
@@ -59,7 +66,7 @@ async def general_exception_handler(request: Request, exc: Exception):
     Catch-all exception handler for unexpected errors.
     """
     logger.error(f"Unexpected error: {exc} - Path: {request.url.path}", exc_info=True)
-    return JSONResponse(
+    return DefaultResponse(
         status_code=500,
         content={
             "error": True,
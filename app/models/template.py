@@ -17,6 +17,7 @@ class Template(Base):
     body_md = Column(Text, nullable=False)
     template_metadata = Column(JSON)
     embedding = Column(Vector(384))
+    source_sha256 = Column(String(64), index=True)  # SHA-256 of the source document text
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     def to_dict(self):
@@ -24,7 +24,7 @@ from app.models.template import Template
 from app.models.template_variable import TemplateVariable
 from app.models.instance import Instance
 from app.services.template_generator import TemplateGenerator
-from app.services.gemini_service import GeminiService
+from app.services.clients import get_gemini
 from app.services.web_template_generator import WebTemplateGenerator, SEARCH_THRESHOLD
 
 logger = logging.getLogger(__name__)
@@ -125,14 +125,19 @@ async def match_template_stream(
             
             # Initialize services
             template_service = TemplateGenerator()
-            gemini = GeminiService()
+            gemini = get_gemini()
             
             # Stage 1: Semantic Search
-            similar_templates = template_service.find_similar_templates(
+            # The query embedding is reused by the semantic match cache in stage 3.
+            # Encoding and the pgvector query block, so they run off the event loop.
+            query_embedding = await asyncio.to_thread(template_service.embed_query, user_query)
+            similar_templates = await asyncio.to_thread(
+                template_service.find_similar_templates,
                 user_query=user_query,
                 db=db,
-            top_k=5
-        )
+                top_k=5,
+                query_embedding=query_embedding
+            )
         
             if not similar_templates:
                 logger.info("No templates with embeddings found in database - falling back to web search")
@@ -149,7 +154,9 @@ async def match_template_stream(
                     # Step 2: Generate template
                     yield f"data: {json.dumps({'status': 'generating_template', 'message': 'Generating template from web content...'})}\n\n"
                     
-                    web_template, web_questions, web_source = web_generator.create_template_from_web(
+                    # Synchronous pipeline (Gemini calls, embedding, DB writes); keep it off the event loop
+                    web_template, web_questions, web_source = await asyncio.to_thread(
+                        web_generator.create_template_from_web,
                         user_query=user_query,
                         db=db
                     )
@@ -203,7 +210,7 @@ async def match_template_stream(
             ]
             
             # Stage 3: Use Gemini to re-rank and explain
-            classification = gemini.find_matching_template(user_query, templates_data)
+            classification = await gemini.afind_matching_template(user_query, templates_data, query_embedding)
             
             if not classification.get("found") or not classification.get("top_match"):
                 logger.info("No suitable template match found in database")
@@ -220,7 +227,9 @@ async def match_template_stream(
                     # Step 2: Generate template
                     yield f"data: {json.dumps({'status': 'generating_template', 'message': 'Generating template from web content...'})}\n\n"
                     
-                    web_template, web_questions, web_source = web_generator.create_template_from_web(
+                    # Synchronous pipeline (Gemini calls, embedding, DB writes); keep it off the event loop
+                    web_template, web_questions, web_source = await asyncio.to_thread(
+                        web_generator.create_template_from_web,
                         user_query=user_query,
                         db=db
                     )
@@ -281,7 +290,9 @@ async def match_template_stream(
                     # Step 2: Generate template
                     yield f"data: {json.dumps({'status': 'generating_template', 'message': 'Generating template from web content...'})}\n\n"
                     
-                    web_template, web_questions, web_source = web_generator.create_template_from_web(
+                    # Synchronous pipeline (Gemini calls, embedding, DB writes); keep it off the event loop
+                    web_template, web_questions, web_source = await asyncio.to_thread(
+                        web_generator.create_template_from_web,
                         user_query=user_query,
                         db=db
                     )
@@ -461,9 +472,9 @@ async def generate_questions(
         if user_query:
             try:
                 logger.info(f"Attempting to prefill variables from query")
-                gemini = GeminiService()
+                gemini = get_gemini()
                 variables_dict = [v.to_dict() for v in variables]
-                prefilled = gemini.prefill_variables_from_query(user_query, variables_dict)
+                prefilled = await gemini.aprefill_variables_from_query(user_query, variables_dict)
                 logger.info(f"Prefilled {len(prefilled)} variables")
             except Exception as e:
                 logger.warning(f"Error prefilling variables (continuing without prefill): {e}")
@@ -9,6 +9,7 @@ from app.schemas.upload import (
     DuplicateTemplateResponseBody,
     DuplicateTemplateInfo
 )
+import asyncio
 import mimetypes
 import logging
 from app.services.document_parser import DocumentParser
@@ -63,8 +64,9 @@ async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db
         
         # Extract text from document (PDF or DOCX)
         try:
+            file_content = await file.read()
             document_parser = DocumentParser()
-            extracted_file_content = document_parser.extract_text_from_document(file)
+            extracted_file_content = document_parser.extract_text_from_bytes(file_content, file_name)
         except HTTPException:
             raise
         except Exception as e:
@@ -93,10 +95,12 @@ async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db
                 detail=f"Failed to save document to database: {str(e)}"
             )
         
-        # Generate template from document
+        # Generate template from document. The pipeline is synchronous (Gemini calls, embedding,
+        # DB writes), so run it in a worker thread instead of blocking the event loop
         try:
             template_generator = TemplateGenerator()
-            template, questions = template_generator.generate_template(
+            template, questions = await asyncio.to_thread(
+                template_generator.generate_template,
                 file_name=file_name, 
                 document_raw_text=extracted_file_content, 
                 db=db
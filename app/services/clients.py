@@ -0,0 +1,30 @@
+"""
+Process-wide service clients.
+
+Constructing these is not free (Gemini model setup, Exa client, loading the
+sentence-transformer weights), and every request path used to build its own.
+They hold no per-request state, so one instance of each is shared.
+"""
+from functools import lru_cache
+
+from app.services.embedding_service import EmbeddingService
+from app.services.exa_service import ExaService
+from app.services.gemini_service import GeminiService
+
+
+@lru_cache(maxsize=None)
+def get_gemini() -> GeminiService:
+    """Get the shared GeminiService (raises ValueError if it can't be configured; retried on next call)."""
+    return GeminiService()
+
+
+@lru_cache(maxsize=None)
+def get_exa() -> ExaService:
+    """Get the shared ExaService."""
+    return ExaService()
+
+
+@lru_cache(maxsize=None)
+def get_embedder() -> EmbeddingService:
+    """Get the shared EmbeddingService, so the model is loaded once per process."""
+    return EmbeddingService()
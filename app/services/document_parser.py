@@ -1,3 +1,4 @@
+import io
 import os
 import pdfplumber
 from fastapi import UploadFile, HTTPException
@@ -30,10 +31,27 @@ class DocumentParser:
         if not file.filename:
             raise HTTPException(status_code=400, detail="Invalid file: filename is missing")
         
+        file.file.seek(0)
+        return self.extract_text_from_bytes(file.file.read(), file.filename)
+    
+    def extract_text_from_bytes(self, file_content: bytes, filename: str) -> str:
+        """
+        Extract text content from an in-memory PDF or DOCX document.
+        
+        Args:
+            file_content: Raw bytes of the uploaded document
+            filename: Original filename, used to pick the extraction backend
+            
+        Returns:
+            str: Extracted text content from all pages
+            
+        Raises:
+            HTTPException: If file is invalid or extraction fails
+        """
         # Check file extension
         file_extension = None
-        if '.' in file.filename:
-            file_extension = '.' + file.filename.split('.')[-1].lower()
+        if '.' in filename:
+            file_extension = '.' + filename.split('.')[-1].lower()
         
         if file_extension not in ['.pdf', '.docx']:
             raise HTTPException(
@@ -41,18 +59,25 @@ class DocumentParser:
                 detail=f"Unsupported file type. Only PDF and DOCX files are supported. Received: {file_extension or 'unknown format'}"
             )
         
+        if not file_content:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
+        
+        # Parse straight from memory - no temp file round-trip
+        stream = io.BytesIO(file_content)
+        
         # Route to appropriate extraction method
         if file_extension == '.pdf':
-            return self._extract_text_from_pdf(file)
+            return self._extract_text_from_pdf(stream, filename)
         elif file_extension == '.docx':
-            return self._extract_text_from_docx(file)
+            return self._extract_text_from_docx(stream, filename)
     
-    def _extract_text_from_pdf(self, file: UploadFile) -> str:
+    def _extract_text_from_pdf(self, stream: io.BytesIO, filename: str) -> str:
         """
         Extract text content from a PDF file.
         
         Args:
-            file: UploadFile object containing the PDF
+            stream: In-memory stream containing the PDF
+            filename: Original filename, used for logging
             
         Returns:
             str: Extracted text content from all pages
@@ -62,8 +87,8 @@ class DocumentParser:
         """
         
         try:
-            extracted_text = ""
-            with pdfplumber.open(file.file) as pdf:
+            text_parts = []
+            with pdfplumber.open(stream) as pdf:
                 if len(pdf.pages) == 0:
                     raise HTTPException(status_code=400, detail="PDF file contains no pages")
                 
@@ -71,7 +96,7 @@ class DocumentParser:
                     try:
                         page_text = page.extract_text()
                         if page_text:
-                            extracted_text += page_text + "\n"
+                            text_parts.append(page_text)
                         else:
                             logger.warning(f"Page {page_num} contained no extractable text")
                     except Exception as e:
@@ -79,31 +104,34 @@ class DocumentParser:
                         # Continue with other pages
                         continue
             
-            if not extracted_text.strip():
+            # Join once instead of repeated string concatenation
+            extracted_text = "\n".join(text_parts).strip()
+            if not extracted_text:
                 raise HTTPException(
                     status_code=400, 
                     detail="No text could be extracted from the PDF. The file may be image-based or corrupted."
                 )
             
-            logger.info(f"Successfully extracted {len(extracted_text)} characters from PDF: {file.filename}")
-            return extracted_text.strip()
+            logger.info(f"Successfully extracted {len(extracted_text)} characters from PDF: {filename}")
+            return extracted_text
             
         except HTTPException:
             # Re-raise HTTP exceptions as-is
             raise
         except Exception as e:
-            logger.error(f"Unexpected error while processing PDF {file.filename}: {e}")
+            logger.error(f"Unexpected error while processing PDF {filename}: {e}")
             raise HTTPException(
                 status_code=500, 
                 detail=f"Failed to process PDF file: {str(e)}"
             )
     
-    def _extract_text_from_docx(self, file: UploadFile) -> str:
+    def _extract_text_from_docx(self, stream: io.BytesIO, filename: str) -> str:
         """
         Extract text content from a DOCX file.
         
         Args:
-            file: UploadFile object containing the DOCX
+            stream: In-memory stream containing the DOCX
+            filename: Original filename, used for logging
             
         Returns:
             str: Extracted text content from the document
@@ -114,26 +142,22 @@ class DocumentParser:
         try:
             from docx import Document as DocxDocument
             
-            # Reset file pointer to beginning
-            file.file.seek(0)
-            
             # Load DOCX document
-            doc = DocxDocument(file.file)
+            doc = DocxDocument(stream)
             
             # Extract text from all paragraphs
-            extracted_text = ""
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    extracted_text += paragraph.text + "\n"
+            extracted_text = "\n".join(
+                paragraph.text for paragraph in doc.paragraphs if paragraph.text.strip()
+            ).strip()
             
-            if not extracted_text.strip():
+            if not extracted_text:
                 raise HTTPException(
                     status_code=400, 
                     detail="No text could be extracted from the DOCX file. The file may be empty or corrupted."
                 )
             
-            logger.info(f"Successfully extracted {len(extracted_text)} characters from DOCX: {file.filename}")
-            return extracted_text.strip()
+            logger.info(f"Successfully extracted {len(extracted_text)} characters from DOCX: {filename}")
+            return extracted_text
             
         except ImportError:
             raise HTTPException(
@@ -144,7 +168,7 @@ class DocumentParser:
             # Re-raise HTTP exceptions as-is
             raise
         except Exception as e:
-            logger.error(f"Unexpected error while processing DOCX {file.filename}: {e}")
+            logger.error(f"Unexpected error while processing DOCX {filename}: {e}")
             raise HTTPException(
                 status_code=500, 
                 detail=f"Failed to process DOCX file: {str(e)}"
@@ -1,36 +1,92 @@
 # Embedding service for semantic search
 from sentence_transformers import SentenceTransformer
+from cachetools import LRUCache
 import numpy as np
-from typing import List
+import torch
+from typing import List, Optional, Union
+import hashlib
+import json
 import os
 import logging
+import threading
+
+from app.services.response_cache import get_response_cache
 
 logger = logging.getLogger(__name__)
 
+# Embeddings remembered in-process by content hash; the on-disk response cache
+# (GEMINI_RESPONSE_CACHE_PATH), when configured, also keeps them across restarts
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+# Concurrent model.encode calls per process (default 1 on CPU, 4 on GPU). Each CPU encode
+# already uses every core through torch's intra-op threads; running several at once
+# only oversubscribes them.
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "0"))
+# Run the model in fp16 on CUDA (off by default: stored template embeddings are fp32)
+EMBEDDING_FP16 = os.getenv("EMBEDDING_FP16", "false").lower() == "true"
+
+EmbeddingLike = Union[List[float], np.ndarray]
+
 
 class EmbeddingService:
     """Service for generating and comparing embeddings for semantic search."""
     
+    # Embedding vectors keyed by _embedding_key(model, text), shared across instances.
+    # Held as float32 arrays (~1.5 KB each, vs ~12 KB as a list of boxed floats);
+    # callers get a fresh list from .tolist()
+    _embedding_cache: LRUCache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+    _cache_lock = threading.Lock()
+    # Limits concurrent encodes across instances; sized on first init from the device
+    _encode_slots: Optional[threading.BoundedSemaphore] = None
+    
     def __init__(self):
         model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.model_name = model_name
         try:
-            logger.info(f"Loading embedding model: {model_name}")
-            self.model = SentenceTransformer(model_name)
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            logger.info(f"Loading embedding model: {model_name} (device: {self.device})")
+            self.model = SentenceTransformer(model_name, device=self.device)
+            if self.device == "cuda" and EMBEDDING_FP16:
+                # Halves GPU memory and compute, but shifts vectors slightly from the fp32
+                # ones already stored; only enable after re-embedding the templates
+                self.model.half()
             self.embedding_dim = self.model.get_sentence_embedding_dimension()
+            # Uncased models (e.g. all-MiniLM-L6-v2) lowercase input in the tokenizer anyway
+            self.lowercases_input = bool(getattr(getattr(self.model, "tokenizer", None), "do_lower_case", False))
+            with EmbeddingService._cache_lock:
+                if EmbeddingService._encode_slots is None:
+                    slots = EMBED_MAX_CONCURRENCY or (4 if self.device == "cuda" else 1)
+                    EmbeddingService._encode_slots = threading.BoundedSemaphore(slots)
             logger.info(f"Embedding model loaded successfully (dimension: {self.embedding_dim})")
         except Exception as e:
             logger.error(f"Failed to load embedding model: {e}")
             raise ValueError(f"Failed to initialize embedding service: {str(e)}")
     
+    def normalize_query(self, text: str) -> str:
+        """
+        Canonical form of a short query for cache lookups, without changing its embedding.
+        
+        Whitespace runs are collapsed (the tokenizer splits on them anyway) and, for
+        uncased models, the text is lowercased.
+        """
+        text = " ".join(text.split())
+        return text.lower() if getattr(self, "lowercases_input", False) else text
+    
+    def _embedding_key(self, text: str) -> str:
+        """Content hash of the model and text, so re-uploads of the same document reuse their vector."""
+        return "embedding:" + hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+    
     def generate_embedding(self, text: str) -> List[float]:
         """
         Generate embedding vector for text.
         
+        Results are cached by content hash, in-process and in the shared on-disk
+        response cache when one is configured.
+        
         Args:
             text: Text to embed
             
         Returns:
-            List of floats representing the embedding vector
+            List of floats representing the unit-normalized embedding vector
             
         Raises:
             ValueError: If text is empty or embedding generation fails
@@ -39,59 +95,87 @@ class EmbeddingService:
             logger.warning("Empty text provided for embedding generation")
             raise ValueError("Text cannot be empty")
         
+        key = self._embedding_key(text)
+        with self._cache_lock:
+            cached = self._embedding_cache.get(key)
+        if cached is not None:
+            return cached.tolist()
+        
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            stored = response_cache.get(key)
+            if stored is not None:
+                embedding_list = json.loads(stored)
+                with self._cache_lock:
+                    self._embedding_cache[key] = np.asarray(embedding_list, dtype=np.float32)
+                logger.debug("Embedding served from disk cache")
+                return embedding_list
+        
         try:
-            embedding = self.model.encode(text, convert_to_numpy=True)
+            with self._encode_slots:
+                embedding = self.model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
             embedding_list = embedding.tolist()
             logger.debug(f"Generated embedding of dimension {len(embedding_list)} for text: {text[:50]}...")
+            with self._cache_lock:
+                self._embedding_cache[key] = embedding.astype(np.float32, copy=False)
+            if response_cache is not None:
+                response_cache.set(key, json.dumps(embedding_list))
             return embedding_list
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             raise ValueError(f"Failed to generate embedding: {str(e)}")
     
-    def compute_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
+    def compute_cosine_raw(self, embedding1: EmbeddingLike, embedding2: EmbeddingLike) -> float:
         """
-        Compute cosine similarity between two embeddings.
+        Compute unclamped cosine similarity between two embeddings.
         
         Args:
             embedding1: First embedding vector
             embedding2: Second embedding vector
             
         Returns:
-            Similarity score between 0 and 1 (higher is more similar)
+            Cosine similarity in [-1, 1]
+            
+        Raises:
+            ValueError: If either embedding is empty, zero-norm, or dimensions differ
         """
-        if not embedding1 or not embedding2:
-            logger.warning("Empty embedding provided for similarity computation")
-            return 0.0
+        if len(embedding1) == 0 or len(embedding2) == 0:
+            raise ValueError("Empty embedding provided for similarity computation")
         
         if len(embedding1) != len(embedding2):
-            logger.error(f"Embedding dimension mismatch: {len(embedding1)} vs {len(embedding2)}")
-            return 0.0
+            raise ValueError(f"Embedding dimension mismatch: {len(embedding1)} vs {len(embedding2)}")
         
-        try:
-            vec1 = np.array(embedding1)
-            vec2 = np.array(embedding2)
-            
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-            
-            if norm1 == 0 or norm2 == 0:
-                logger.warning("Zero-norm vector encountered in similarity computation")
-                return 0.0
-            
-            similarity = float(dot_product / (norm1 * norm2))
-            # Clamp to [0, 1] range (cosine similarity can be -1 to 1)
-            similarity = max(0.0, min(1.0, (similarity + 1) / 2))
+        vec1 = np.asarray(embedding1, dtype=np.float32)
+        vec2 = np.asarray(embedding2, dtype=np.float32)
+        
+        norm_product = np.linalg.norm(vec1) * np.linalg.norm(vec2)
+        if norm_product == 0:
+            raise ValueError("Zero-norm vector encountered in similarity computation")
+        
+        return float(np.dot(vec1, vec2) / norm_product)
+    
+    def compute_similarity(self, embedding1: EmbeddingLike, embedding2: EmbeddingLike) -> float:
+        """
+        Compute cosine similarity between two embeddings.
+        
+        Args:
+            embedding1: First embedding vector
+            embedding2: Second embedding vector
             
-            return similarity
+        Returns:
+            Similarity score between 0 and 1 (higher is more similar)
+        """
+        try:
+            # Rescale [-1, 1] cosine to [0, 1] once, at the API boundary
+            return float(np.clip((self.compute_cosine_raw(embedding1, embedding2) + 1.0) * 0.5, 0.0, 1.0))
         except Exception as e:
-            logger.error(f"Error computing similarity: {e}")
+            logger.warning(f"Could not compute similarity: {e}")
             return 0.0
     
     def find_most_similar(
         self, 
-        query_embedding: List[float], 
-        candidate_embeddings: List[List[float]],
+        query_embedding: EmbeddingLike, 
+        candidate_embeddings: Union[List[List[float]], np.ndarray],
         top_k: int = 5
     ) -> List[int]:
         """
@@ -99,28 +183,34 @@ class EmbeddingService:
         
         Args:
             query_embedding: Query embedding vector
-            candidate_embeddings: List of candidate embedding vectors
+            candidate_embeddings: (N, d) array or list of candidate vectors
             top_k: Number of top results to return
             
         Returns:
             List of indices sorted by similarity (highest first)
         """
-        if not query_embedding or not candidate_embeddings:
+        if len(query_embedding) == 0 or len(candidate_embeddings) == 0:
             logger.warning("Empty embeddings provided for similarity search")
             return []
         
         try:
-            similarities = []
-            for i, candidate in enumerate(candidate_embeddings):
-                sim = self.compute_similarity(query_embedding, candidate)
-                similarities.append((i, sim))
+            candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+            query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+            if candidates.ndim != 2 or query.shape[0] != candidates.shape[1]:
+                raise ValueError(f"Embedding dimension mismatch: {query.shape[0]} vs {candidates.shape[-1]}")
             
-            # Sort by similarity descending
-            similarities.sort(key=lambda x: x[1], reverse=True)
+            norms = np.linalg.norm(candidates, axis=1) * np.linalg.norm(query)
+            norms[norms == 0] = 1.0
+            # Rank on raw cosine - the [0, 1] rescale is monotonic and not needed here
+            scores = (candidates @ query) / norms
             
-            # Return top k indices
-            result_indices = [idx for idx, _ in similarities[:top_k]]
-            logger.info(f"Found {len(result_indices)} most similar candidates from {len(candidate_embeddings)} total")
+            # Partial selection of the top k, then sort just those
+            k = min(top_k, scores.shape[0])
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            result_indices = top[np.argsort(-scores[top], kind="stable")].tolist()
+            logger.info(f"Found {len(result_indices)} most similar candidates from {scores.shape[0]} total")
             
             return result_indices
         except Exception as e:
@@ -169,6 +169,12 @@ class ExaService:
         if title_legal_score >= 2:
             return True
         
+        # If neither the title nor the URL hints at legal content, skip scanning the body
+        if title_legal_score == 0:
+            url_lower = result.url.lower() if result.url else ""
+            if not any(keyword in url_lower for keyword in legal_keywords):
+                return False
+        
         # Check text content
         text_content = ""
         if hasattr(result, 'text') and result.text:
@@ -208,13 +214,18 @@ class ExaService:
         Returns:
             True if content appears to be an actual legal template
         """
-        title = result.title.lower() if result.title else ""
         url = result.url.lower() if result.url else ""
         
+        # Exclude obvious commercial sites first - cheapest disqualifier
+        commercial_domains = ["amazon", "ebay", "etsy", "shopify", "wix", "squarespace"]
+        if any(domain in url for domain in commercial_domains):
+            return False
+        
         # Simple check: if title or URL contains template-related keywords, it's likely a template
         template_keywords = ["template", "sample", "form", "draft", "example", "agreement", "contract"]
         
         # Check title
+        title = result.title.lower() if result.title else ""
         if any(keyword in title for keyword in template_keywords):
             return True
             
@@ -222,12 +233,6 @@ class ExaService:
         if any(keyword in url for keyword in template_keywords):
             return True
             
-        # If it's legal content and doesn't look like a commercial site, include it
-        # Exclude obvious commercial sites
-        commercial_domains = ["amazon", "ebay", "etsy", "shopify", "wix", "squarespace"]
-        if any(domain in url for domain in commercial_domains):
-            return False
-            
         # For legal content, be more permissive
         return True
     
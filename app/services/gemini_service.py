@@ -1,15 +1,736 @@
 import google.generativeai as genai
+from google.generativeai import caching
+import asyncio
+import copy
+import datetime
+import hashlib
 import json
 import os
+import random
 import re
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+import time
+import weakref
+import numpy as np
+from dataclasses import dataclass
+from functools import lru_cache
+from concurrent.futures import Future
+from typing import Annotated, Callable, Dict, List, Any, Optional, Sequence, Set, Tuple
+from cachetools import LRUCache
+from pydantic import StringConstraints, TypeAdapter, ValidationError
 from app.services.prompts import LegalDocumentPrompts
+from app.services.response_cache import get_response_cache
 
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # C Aho-Corasick automaton: one linear pass regardless of variable count
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    # Tolerant parser for the usual LLM JSON slips (trailing commas, truncation, stray prose)
+    import json_repair
+except ImportError:
+    json_repair = None
+
+try:
+    # Drop-in `re` replacement that can release the GIL while matching large texts
+    import regex
+except ImportError:
+    regex = None
+
+try:
+    # Local template scoring over template metadata
+    from sklearn.feature_extraction.text import TfidfVectorizer
+except ImportError:
+    TfidfVectorizer = None
+
+try:
+    # Tie-breaker for the local template scores
+    from rapidfuzz.distance import JaroWinkler
+except ImportError:
+    JaroWinkler = None
+
+# Trailing commas before a closing bracket, the most common malformed-JSON slip
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
+
+def _strict_json_loads(text: str) -> Any:
+    """Parse JSON with orjson when available, falling back to the stdlib."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _repair_json(text: str) -> Any:
+    """
+    Best-effort parse of a malformed JSON response.
+    
+    Args:
+        text: Response text that failed strict parsing
+        
+    Returns:
+        Parsed object or array
+        
+    Raises:
+        ValueError: If the text can't be repaired
+    """
+    if json_repair is not None:
+        repaired = json_repair.loads(text)
+        # json_repair returns "" rather than raising on hopeless input
+        if isinstance(repaired, (dict, list)):
+            return repaired
+        raise ValueError("Unrepairable JSON response")
+    
+    # Stdlib fallback: trim prose around the outermost value and drop trailing commas
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        raise ValueError("No JSON value in response")
+    start = min(starts)
+    end = text.rfind('}' if text[start] == '{' else ']')
+    if end <= start:
+        raise ValueError("Unterminated JSON value in response")
+    return json.loads(_TRAILING_COMMA_RE.sub(r'\1', text[start:end + 1]))
+
+
+def _json_loads(text: str) -> Any:
+    """
+    Parse a JSON response, repairing common malformations before giving up.
+    
+    Strict parsing is tried first so well-formed responses pay nothing extra;
+    a repaired parse avoids re-prompting the model for the whole step.
+    
+    Raises:
+        json.JSONDecodeError: If the text is neither valid nor repairable
+    """
+    try:
+        return _strict_json_loads(text)
+    except json.JSONDecodeError as e:
+        try:
+            result = _repair_json(text)
+        except ValueError:
+            raise e
+        logger.warning(f"Recovered malformed JSON response: {e}")
+        return result
+
+
+def _json_dumps(obj: Any) -> str:
+    """
+    Serialize to compact JSON with orjson when available, falling back to the stdlib.
+    
+    Output only goes into prompts, so no pretty-printing: fewer tokens, and the
+    stdlib keeps to its C encoder (indent forces the pure-Python one).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+# Runs of whitespace, collapsed so examples match across line breaks / double spaces
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Prefill validation constants
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_BOOL_TRUE = frozenset({'true', 'yes', 'enabled', '1'})
+_BOOL_FALSE = frozenset({'false', 'no', 'disabled', '0'})
+
+# Canonical validators for the patterns the extraction prompt tells the LLM to emit, by dtype
+_VALIDATORS: Dict[str, "re.Pattern"] = {
+    "date": _DATE_RE,
+    "currency": re.compile(r'^\d+(\.\d{2})?$'),
+}
+_CANONICAL_PATTERNS = {pattern.pattern: pattern for pattern in _VALIDATORS.values()}
+
+
+def get_validator(dtype: Optional[str]) -> Optional["re.Pattern"]:
+    """Canonical compiled validator for a dtype, or None if the dtype has none."""
+    return _VALIDATORS.get(dtype)
+
+
+@lru_cache(maxsize=1024)
+def _compile_variable_regex(pattern: str) -> Optional["re.Pattern"]:
+    """
+    Compile a variable's regex once per process.
+    
+    The canonical date/currency patterns map to the shared validators; anything else
+    is compiled on first sight. Returns None for patterns that don't compile.
+    """
+    canonical = _CANONICAL_PATTERNS.get(pattern)
+    if canonical is not None:
+        return canonical
+    try:
+        return re.compile(pattern)
+    except re.error:
+        return None
+
+# Deterministic extractors for prefill, by dtype; a value is used only when unambiguous
+_LOCAL_EXTRACTORS = {
+    "date": re.compile(r'(?<!\d)\d{4}-\d{2}-\d{2}(?!\d)'),
+    "email": re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+'),
+    "phone": re.compile(r'(?<![\w+])\+?\(?\d{1,4}\)?(?:[\s.-]?\d{2,4}){2,4}(?!\w)'),
+    "currency": re.compile(r'[$€£₹]\s?(\d[\d,]*(?:\.\d{1,2})?)'),
+}
+
+# Candidate variable values for the combined prompt's hints, all categories in one pass
+_DOCUMENT_HINT_RE = re.compile(
+    r'(?P<dates>\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b'
+    r'|\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.? \d{1,2},? \d{4}\b)'
+    r'|(?P<amounts>(?:[$€£₹]|\b(?:Rs\.?|INR|USD|EUR|GBP)\s?)\s?\d[\d,]*(?:\.\d+)?)'
+    r'|(?P<percentages>\b\d+(?:\.\d+)?\s?%)'
+    r'|(?P<emails>[\w.+-]+@[\w-]+(?:\.[\w-]+)+)'
+    r'|(?P<identifiers>\b[A-Z]{2,}-[A-Z0-9-]*\d[A-Z0-9-]*\b|#\s?\d{4,}\b)'
+)
+# Distinct values kept per hint category
+_DOCUMENT_HINT_LIMIT = 20
+
+
+def _document_hints(text: str) -> Dict[str, List[str]]:
+    """
+    Find candidate dates, amounts, percentages, emails and identifiers in a document.
+    
+    Returns:
+        Distinct values by category, in document order; empty categories are omitted
+    """
+    hints: Dict[str, Dict[str, None]] = {}
+    for match in _DOCUMENT_HINT_RE.finditer(text):
+        values = hints.setdefault(match.lastgroup, {})
+        if len(values) < _DOCUMENT_HINT_LIMIT:
+            values[match.group().strip()] = None
+    return {category: list(values) for category, values in hints.items()}
+
+
+# Matches the body of a ``` / ```json / ```yaml fenced block (closing fence optional)
+_FENCE_RE = re.compile(r"```(?:json|yaml)?\s*(.*?)(?:```|$)", re.DOTALL)
+# A fence wrapping an entire markdown response (any language tag); inner fences are kept
+_OUTER_FENCE_RE = re.compile(r"\A```[^\n]*\n(.*?)(?:\n```)?\s*\Z", re.DOTALL)
+
+# Upper bound on concurrent in-flight Gemini requests, to stay within API QPS limits
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", "512"))
+# Compiled example-replacement matchers kept; each can hold a large automaton or regex
+GEMINI_PATTERN_CACHE_SIZE = int(os.getenv("GEMINI_PATTERN_CACHE_SIZE", "64"))
+# Client-side request/token budgets per minute (0 disables); set to the project's quota
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "0"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "0"))
+# find_matching_template: candidates carrying a semantic_similarity at or above this
+# are accepted without an LLM call; otherwise only the top few are sent for re-ranking
+MATCH_DIRECT_THRESHOLD = float(os.getenv("MATCH_DIRECT_THRESHOLD", "0.8"))
+MATCH_RERANK_TOP_K = int(os.getenv("MATCH_RERANK_TOP_K", "3"))
+MATCH_MIN_CONFIDENCE = 0.6
+# Paraphrased queries (query embeddings at least this similar) against the same
+# candidate set reuse an earlier match instead of calling Gemini again
+MATCH_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("MATCH_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+# Queries remembered per candidate set in the semantic match cache
+MATCH_SEMANTIC_CACHE_PER_SET = 32
+# Candidates without similarity scores are cut to this many by tag/title overlap before Gemini
+MATCH_LEXICAL_TOP_K = int(os.getenv("MATCH_LEXICAL_TOP_K", "5"))
+# A local TF-IDF score (fit over the whole catalog) at or above this is accepted without
+# an LLM call, provided it leads the runner-up by at least MATCH_LOCAL_MARGIN
+MATCH_LOCAL_THRESHOLD = float(os.getenv("MATCH_LOCAL_THRESHOLD", "0.6"))
+MATCH_LOCAL_MARGIN = float(os.getenv("MATCH_LOCAL_MARGIN", "0.15"))
+
+# Variables per question-generation call; larger sets are split and sent concurrently
+GEMINI_QUESTION_BATCH_SIZE = int(os.getenv("GEMINI_QUESTION_BATCH_SIZE", "25"))
+# Build questions for common dtypes from fixed templates instead of asking the LLM
+QUESTION_TEMPLATES_ENABLED = os.getenv("QUESTION_TEMPLATES_ENABLED", "false").lower() == "true"
+
+# Server-side context caching of static prompt preambles. Cached content needs a
+# pinned model version and a minimum prompt size, so it is opt-in.
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+GEMINI_CONTEXT_CACHE_MODEL = os.getenv("GEMINI_CONTEXT_CACHE_MODEL", "models/gemini-2.0-flash-001")
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+
+def _content_key(*parts: str) -> str:
+    """Stable 128-bit content hash used as a response cache key."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+# Content keys of fixed prompt histories, by object identity: (history, key). The
+# histories are module-level prompt constants, so each is serialized once per process.
+_history_keys: Dict[int, Tuple[Sequence[Dict[str, Any]], str]] = {}
+
+
+def _history_key(history: Sequence[Dict[str, Any]]) -> str:
+    """Content key of a fixed sequence of prior turns, memoized by identity."""
+    entry = _history_keys.get(id(history))
+    if entry is None or entry[0] is not history:
+        entry = (history, _content_key(_json_dumps(list(history))))
+        _history_keys[id(history)] = entry
+    return entry[1]
+
+
+class _TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at a per-minute rate.
+    
+    reserve() always succeeds and returns how long the caller must wait; the
+    balance may go negative, so concurrent callers queue up behind each other
+    instead of all firing at once and hitting 429s.
+    """
+    
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.fill_rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens; returns the delay in seconds before they are available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.fill_rate
+
+
+_request_bucket = _TokenBucket(GEMINI_RPM) if GEMINI_RPM > 0 else None
+_token_bucket = _TokenBucket(GEMINI_TPM) if GEMINI_TPM > 0 else None
+
+
+def _rate_limit_delay(prompt: str) -> float:
+    """Reserve one request and the prompt's estimated tokens (~4 chars each); returns the wait."""
+    delay = 0.0
+    if _request_bucket is not None:
+        delay = _request_bucket.reserve()
+    if _token_bucket is not None:
+        delay = max(delay, _token_bucket.reserve(len(prompt) / 4))
+    return delay
+
+
+# One GEMINI_MAX_CONCURRENCY limit per event loop, shared by every async Gemini call
+# on it (an asyncio.Semaphore can only be used from the loop it was created for)
+_loop_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_loop_semaphores_lock = threading.Lock()
+
+
+def _loop_semaphore() -> asyncio.Semaphore:
+    """Get the shared request semaphore of the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _loop_semaphores_lock:
+        semaphore = _loop_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = _loop_semaphores[loop] = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        return semaphore
+
+
+def _run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code.
+    
+    Only for genuinely sync callers (e.g. a worker thread): waiting on the
+    coroutine from inside a running event loop would stall every other request
+    on that loop, so async callers must await the async variant instead.
+    
+    Raises:
+        RuntimeError: If called from a thread with a running event loop
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    
+    coro.close()
+    raise RuntimeError("Synchronous Gemini wrapper called from a running event loop; await the async variant")
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+def _aho_corasick_replace(automaton: Any, text: str) -> Optional[str]:
+    """
+    Replace whole-token automaton matches in text, leftmost-longest, in one pass.
+    
+    Args:
+        automaton: ahocorasick.Automaton over lowercased examples, values (length, placeholder)
+        text: Text to scan
+        
+    Returns:
+        Text with placeholders, or None if lowercasing changes the text length
+        (match offsets would no longer line up with the original)
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        return None
+    
+    matches = []
+    for end, (length, placeholder) in automaton.iter(lowered):
+        start = end - length + 1
+        if start > 0 and _is_word_char(text[start - 1]):
+            continue
+        if end + 1 < len(text) and _is_word_char(text[end + 1]):
+            continue
+        matches.append((start, -length, placeholder))
+    matches.sort()
+    
+    parts = []
+    position = 0
+    for start, negative_length, placeholder in matches:
+        if start < position:
+            continue
+        parts.append(text[position:start])
+        parts.append(placeholder)
+        position = start - negative_length
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+# Characters that affect JSON nesting; everything else can be skipped when scanning
+_JSON_STRUCTURE_RE = re.compile(r'[{}\[\]"\\]')
+# What may precede the top-level value: whitespace and an opening ``` / ```json fence line
+_JSON_LEAD_RE = re.compile(r'\s*(?:```[^\n`]*\n\s*)?')
+# Longer leading text can't be a fence line; stop buffering it
+_JSON_LEAD_MAX = 64
+
+
+class _JsonStreamTracker:
+    """
+    Detects when a streamed response has emitted one complete top-level JSON value.
+    
+    Fed chunk by chunk; tracks bracket depth outside string literals so the
+    caller can stop reading as soon as the value closes instead of waiting
+    for trailing fence/commentary tokens. Only a value opening the response
+    (after optional whitespace and fence line) is tracked: with leading prose,
+    a bracket in the prose could end the stream early, so the whole response is read.
+    """
+    __slots__ = ("depth", "started", "abandoned", "lead", "in_string", "escape_at", "offset")
+    
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.abandoned = False
+        # Text seen before the value starts
+        self.lead = ""
+        self.in_string = False
+        # Absolute position of the character escaped by a preceding backslash
+        self.escape_at = -1
+        self.offset = 0
+    
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk; returns True once the top-level JSON value is complete."""
+        if self.abandoned:
+            return False
+        for match in _JSON_STRUCTURE_RE.finditer(chunk):
+            position = self.offset + match.start()
+            if position == self.escape_at:
+                continue
+            char = match.group()
+            if self.in_string:
+                if char == '\\':
+                    self.escape_at = position + 1
+                elif char == '"':
+                    self.in_string = False
+            elif not self.started:
+                if char not in '{[' or not _JSON_LEAD_RE.fullmatch(self.lead + chunk[:match.start()]):
+                    self.abandoned = True
+                    return False
+                self.started = True
+                self.depth = 1
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    self.offset += len(chunk)
+                    return True
+        if not self.started:
+            self.lead += chunk
+            if len(self.lead) > _JSON_LEAD_MAX:
+                self.abandoned = True
+        self.offset += len(chunk)
+        return False
+
+
+@dataclass(slots=True)
+class VarSpec:
+    """Typed view of a variable definition, built once from the LLM/DB dict."""
+    key: Annotated[str, StringConstraints(min_length=1)]
+    label: Optional[str] = None
+    description: Optional[str] = None
+    example: Optional[Any] = None
+    required: bool = False
+    dtype: Optional[str] = "string"
+    regex: Optional[str] = None
+    enum_values: Optional[List[str]] = None
+    
+    @classmethod
+    def from_dict(cls, var: Dict[str, Any]) -> "VarSpec":
+        return cls(
+            key=var["key"],
+            label=var.get("label"),
+            description=var.get("description"),
+            example=var.get("example"),
+            required=var.get("required", False),
+            dtype=var.get("dtype", "string"),
+            regex=var.get("regex"),
+            enum_values=var.get("enum_values")
+        )
+    
+    def to_question(self, question: str) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "question": question,
+            "description": self.description,
+            "example": self.example,
+            "required": self.required,
+            "dtype": self.dtype,
+            "regex": self.regex,
+            "enum_values": self.enum_values
+        }
+
+
+# Validates a whole list of variable dicts in one pydantic-core call
+_VAR_SPEC_LIST = TypeAdapter(List[VarSpec])
+
+
+def _to_var_specs(variables: List[Any]) -> List[VarSpec]:
+    """
+    Convert a list of variable dicts to VarSpecs.
+    
+    Clean input (the common case) is validated in a single pass. If any entry is
+    invalid, falls back to converting item by item, dropping entries without a key.
+    """
+    try:
+        return _VAR_SPEC_LIST.validate_python(variables)
+    except ValidationError as e:
+        logger.warning(f"Variable list failed validation ({e.error_count()} errors), filtering invalid entries")
+    return [VarSpec.from_dict(v) for v in variables if isinstance(v, dict) and v.get("key")]
+
+
+def _fallback_questions(variables: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Build simple questions from variable labels without calling the LLM.
+    
+    Args:
+        variables: List of variable definitions
+        
+    Returns:
+        List of question dictionaries
+    """
+    return [
+        spec.to_question(f"What is the {(spec.label or spec.key.replace('_', ' ')).lower()}?")
+        for spec in _to_var_specs(variables)
+    ]
+
+
+# Lowercase word tokens for lexical template matching; shorter ones are too unspecific
+_MATCH_TOKEN_RE = re.compile(r'[a-z0-9]{3,}')
+# Trie node keys for template indices, kept apart from the single-character child keys
+_TRIE_IDS = "ids"
+_TRIE_END = "end"
+# A template token that is a prefix of a query token ("agreement" in "agreements") must be this long
+_TRIE_MIN_STEM = 4
+
+
+def _template_match_text(template: Dict[str, Any]) -> str:
+    """Title, doc type, jurisdiction and similarity tags of a candidate, lowercased."""
+    return " ".join([
+        template.get("title") or "", template.get("doc_type") or "", template.get("jurisdiction") or "",
+        *(template.get("similarity_tags") or [])
+    ]).lower()
+
+
+def _build_template_trie(templates: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Index template titles, doc types, jurisdictions and similarity tags by token prefix.
+    
+    Every node records the templates with a token through it (ids) and the
+    templates with a token ending at it (end).
+    """
+    root: Dict[str, Any] = {}
+    for idx, t in enumerate(templates):
+        for token in set(_MATCH_TOKEN_RE.findall(_template_match_text(t))):
+            node = root
+            for ch in token:
+                node = node.setdefault(ch, {})
+                node.setdefault(_TRIE_IDS, set()).add(idx)
+            node.setdefault(_TRIE_END, set()).add(idx)
+    return root
+
+
+def _lexical_shortlist(user_query: str, templates: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Keep the top_k templates sharing the most query tokens, by prefix, in their metadata.
+    
+    One trie walk per query token: a query token matches template tokens it is a
+    prefix of ("employ" -> "employment") and template tokens that are a prefix of
+    it ("agreement" -> "agreements"). If nothing matches, the list is returned
+    as is and Gemini sees every candidate.
+    """
+    trie = _build_template_trie(templates)
+    scores = [0] * len(templates)
+    for token in set(_MATCH_TOKEN_RE.findall(user_query.lower())):
+        node = trie
+        matched: set = set()
+        for depth, ch in enumerate(token, 1):
+            node = node.get(ch)
+            if node is None:
+                break
+            if depth >= _TRIE_MIN_STEM:
+                matched |= node.get(_TRIE_END, set())
+        else:
+            matched |= node.get(_TRIE_IDS, set())
+        for idx in matched:
+            scores[idx] += 1
+    
+    if not any(scores):
+        return templates
+    ranked = sorted(range(len(templates)), key=lambda idx: scores[idx], reverse=True)
+    return [templates[idx] for idx in ranked[:top_k] if scores[idx]]
+
+
+def _local_match_ranking(user_query: str, templates: List[Dict[str, Any]]) -> Optional[List[Tuple[float, Dict[str, Any]]]]:
+    """
+    Score candidates against the query locally: TF-IDF cosine over their metadata,
+    ties broken by Jaro-Winkler similarity of the query and title.
+    
+    Returns:
+        (score, template) pairs, best first, or None if scikit-learn is
+        unavailable or the candidates have no usable text
+    """
+    if TfidfVectorizer is None or not templates:
+        return None
+    try:
+        vectorizer = TfidfVectorizer(sublinear_tf=True)
+        matrix = vectorizer.fit_transform([_template_match_text(t) for t in templates])
+    except ValueError:
+        # Empty vocabulary: no candidate has any text to score
+        return None
+    
+    # Rows are L2-normalized, so the dot product is the cosine similarity
+    query = user_query.lower()
+    scores = (matrix @ vectorizer.transform([query]).T).toarray().ravel()
+    
+    def _rank_key(idx: int) -> Tuple[float, float]:
+        title = (templates[idx].get("title") or "").lower()
+        tie_break = JaroWinkler.normalized_similarity(query, title) if JaroWinkler is not None else 0.0
+        return scores[idx], tie_break
+    
+    ranked = sorted(range(len(templates)), key=_rank_key, reverse=True)
+    return [(float(scores[idx]), templates[idx]) for idx in ranked]
+
+
+def _local_match_accepted(ranking: Optional[List[Tuple[float, Dict[str, Any]]]]) -> bool:
+    """
+    Whether a local ranking is decisive enough to skip Gemini: the best score must
+    reach MATCH_LOCAL_THRESHOLD and beat the runner-up by MATCH_LOCAL_MARGIN.
+    """
+    if not ranking or ranking[0][0] < MATCH_LOCAL_THRESHOLD:
+        return False
+    return len(ranking) == 1 or ranking[0][0] - ranking[1][0] >= MATCH_LOCAL_MARGIN
+
+
+_PREFILL_SCHEMA_FIELDS = ("key", "label", "description", "dtype", "regex", "enum_values", "required")
+
+
+def _prefill_schema_key(variables: List[Any]) -> Optional[tuple]:
+    """
+    Hashable key of the fields the prefill prompt sends, or None if a variable
+    isn't a plain dict of hashable values (lists are keyed as tuples).
+    """
+    try:
+        return tuple(
+            tuple(tuple(val) if isinstance(val, list) else val for val in map(var.get, _PREFILL_SCHEMA_FIELDS))
+            for var in variables
+        )
+    except (AttributeError, TypeError):
+        return None
+
+
+# Stands in for the variable label in structurally cached questions
+_LABEL_TOKEN = "<LABEL>"
+
+# Question templates by dtype; {label} is the lowercased variable label
+_QUESTION_FORMATS = {
+    "string": "What is the {label}?",
+    "date": "What is the {label}? (YYYY-MM-DD)",
+    "number": "What is the {label}?",
+    "currency": "What is the {label}? (numbers only)",
+    "email": "What is the {label}?",
+    "phone": "What is the {label}?",
+    "address": "What is the {label}?",
+    "boolean": "Does the {label} apply? (yes/no)",
+}
+
+
+def _template_question(spec: VarSpec) -> Optional[str]:
+    """
+    Deterministic question for a variable, or None if it needs the LLM.
+    
+    Enums and the common dtypes use fixed templates; a variable of an unusual
+    dtype goes to the LLM only when it has a description to phrase from.
+    """
+    label = _spec_label(spec).lower()
+    if spec.enum_values:
+        return f"Which {label} applies? ({', '.join(map(str, spec.enum_values))})"
+    question_format = _QUESTION_FORMATS.get(spec.dtype or "string")
+    if question_format is None:
+        if spec.description:
+            return None
+        question_format = _QUESTION_FORMATS["string"]
+    return question_format.format(label=label)
+
+
+def _spec_label(spec: VarSpec) -> str:
+    return spec.label or spec.key.replace('_', ' ')
+
+
+def _question_pattern_key(spec: VarSpec) -> Optional[Tuple[str, str]]:
+    """
+    Structural key for a variable: dtype plus its description with the label abstracted.
+    
+    Variables without a description carry too little structure to share a question.
+    """
+    description = _WHITESPACE_RE.sub(' ', spec.description or '').strip().lower()
+    if not description:
+        return None
+    return (spec.dtype or "string", description.replace(_spec_label(spec).lower(), _LABEL_TOKEN))
+
 
 class GeminiService:
+    # Class-level and bounded: one instance is shared process-wide (app.services.clients),
+    # so every cache must have a size limit and be accessed under _cache_lock.
+    # Only successful (parsed) responses are cached.
+    _classify_cache: LRUCache = LRUCache(maxsize=GEMINI_CACHE_SIZE)
+    _match_cache: LRUCache = LRUCache(maxsize=GEMINI_CACHE_SIZE)
+    # Candidate-set key -> [(unit query embedding, match result)], for paraphrased queries
+    _match_semantic_cache: LRUCache = LRUCache(maxsize=GEMINI_CACHE_SIZE)
+    # Parsed extraction results keyed by (prompt kind, chunk text, existing variables)
+    _extract_cache: LRUCache = LRUCache(maxsize=GEMINI_CACHE_SIZE)
+    # Question templates keyed by _question_pattern_key: (template, label_lowercased)
+    _question_cache: LRUCache = LRUCache(maxsize=GEMINI_CACHE_SIZE)
+    # Serialized prefill variable info keyed by _prefill_schema_key, so every request
+    # against the same template shares one string (and its cached hash)
+    _prefill_schema_cache: LRUCache = LRUCache(maxsize=GEMINI_CACHE_SIZE)
+    # Compiled replacement matchers keyed by the (example, key) set they were built from
+    _replacement_patterns: LRUCache = LRUCache(maxsize=GEMINI_PATTERN_CACHE_SIZE)
+    _cache_lock = threading.Lock()
+    # Pending requests keyed by prompt hash, so identical concurrent prompts share one API call.
+    # concurrent.futures.Future works across threads and event loops alike.
+    _inflight: Dict[str, Future] = {}
+    _inflight_lock = threading.Lock()
+    # Models bound to cached preambles: name -> (model or None if unavailable, refresh deadline)
+    _context_models: Dict[str, Tuple[Any, float]] = {}
+    _context_lock = threading.Lock()
+    
     def __init__(self):
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
@@ -24,6 +745,336 @@ class GeminiService:
             logger.error(f"Failed to initialize Gemini model: {e}")
             raise ValueError(f"Failed to initialize Gemini model: {str(e)}")
     
+    @staticmethod
+    def _strip_fence(text: str) -> str:
+        """
+        Strip a markdown code fence from an LLM response, if present.
+        
+        Args:
+            text: Raw response text
+            
+        Returns:
+            The fenced content, or the text unchanged if it has no fence
+        """
+        if "```" not in text:
+            return text
+        match = _FENCE_RE.search(text)
+        return match.group(1).strip() if match else text
+    
+    def _parse_json_response(self, text: str) -> Any:
+        """
+        Strip any code fence and parse a JSON response.
+        
+        Sync CPU-only post-processing, run via asyncio.to_thread from async paths.
+        """
+        return _json_loads(self._strip_fence(text))
+    
+    def _get_cached_model(self, name: str, preamble: str) -> Optional[Any]:
+        """
+        Get a model whose Gemini cached content already holds a static preamble.
+        
+        The cache is created on first use and recreated shortly before its TTL
+        expires. Failures (caching disabled, preamble below the minimum cacheable
+        size, unsupported model) are remembered for one TTL period so callers fall
+        back to sending the full prompt without retrying on every request.
+        
+        Args:
+            name: Stable name of the preamble
+            preamble: Static instruction text to cache
+            
+        Returns:
+            GenerativeModel bound to the cached content, or None to use the full prompt
+        """
+        if not GEMINI_CONTEXT_CACHE:
+            return None
+        
+        now = time.monotonic()
+        with self._context_lock:
+            entry = self._context_models.get(name)
+            if entry is not None and entry[1] > now:
+                return entry[0]
+            
+            try:
+                cached_content = caching.CachedContent.create(
+                    model=GEMINI_CONTEXT_CACHE_MODEL,
+                    display_name=f"legalplates-{name}",
+                    contents=[preamble],
+                    ttl=datetime.timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL)
+                )
+                model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+                logger.info(f"Created Gemini context cache for '{name}' preamble")
+            except Exception as e:
+                logger.warning(f"Context caching unavailable for '{name}', sending full prompts: {e}")
+                model = None
+            
+            # Refresh a minute ahead of the server-side expiry
+            self._context_models[name] = (model, now + max(GEMINI_CONTEXT_CACHE_TTL - 60, 1))
+            return model
+    
+    @staticmethod
+    def _request_key(model: Any, prompt: str, history: Optional[Sequence[Dict[str, Any]]] = None) -> str:
+        """Content hash identifying a request: model, cached preamble, prior turns and prompt."""
+        return _content_key(
+            getattr(model, "model_name", ""),
+            getattr(model, "cached_content", None) or "",
+            _history_key(history) if history else "",
+            prompt
+        )
+    
+    @staticmethod
+    def _contents(prompt: str, history: Optional[Sequence[Dict[str, Any]]] = None) -> Any:
+        """Request contents: the bare prompt, or prior turns followed by the prompt as a user turn."""
+        if not history:
+            return prompt
+        return [*history, {"role": "user", "parts": [prompt]}]
+    
+    def _should_store_response(self, text: str, json_response: bool) -> bool:
+        """
+        Whether a response may go to the disk cache.
+        
+        JSON responses are stored only if they parse as is: a truncated or
+        malformed generation would otherwise be replayed on every retry until
+        its entry expired.
+        """
+        if not text:
+            return False
+        if not json_response:
+            return True
+        try:
+            _strict_json_loads(self._strip_fence(text))
+        except ValueError:
+            logger.warning("Not caching unparseable Gemini JSON response")
+            return False
+        return True
+    
+    def _claim_inflight(self, key: str) -> Tuple[Future, bool]:
+        """
+        Look up or register the pending request for a prompt hash.
+        
+        Returns:
+            (future, is_owner) - the owner must resolve the future via _resolve_inflight
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+    
+    def _resolve_inflight(
+        self,
+        key: str,
+        future: Future,
+        result: Optional[str] = None,
+        error: Optional[BaseException] = None
+    ) -> None:
+        """Unregister a pending request and hand its outcome to any waiters."""
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    def _generate_text(
+        self,
+        prompt: str,
+        model: Optional[Any] = None,
+        json_response: bool = False,
+        history: Optional[Sequence[Dict[str, Any]]] = None
+    ) -> str:
+        """
+        Stream a completion from Gemini and return the full stripped text.
+        
+        Streaming lets the response body arrive incrementally instead of waiting
+        for the whole completion to be buffered server-side. Identical prompts
+        already in flight are joined rather than re-sent.
+        
+        Args:
+            prompt: Prompt to send
+            model: Model to use instead of self.model (e.g. one bound to cached content)
+            json_response: Stop reading once a complete top-level JSON value has arrived
+            history: Fixed prior turns (e.g. few-shot examples) sent ahead of the prompt
+            
+        Returns:
+            Stripped response text
+        """
+        model = model or self.model
+        key = self._request_key(model, prompt, history)
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            cached = response_cache.get(key)
+            if cached is not None:
+                logger.info("Gemini response served from disk cache")
+                return cached
+        
+        future, is_owner = self._claim_inflight(key)
+        if not is_owner:
+            logger.info("Joining in-flight Gemini request for identical prompt")
+            return future.result()
+        
+        try:
+            delay = _rate_limit_delay(prompt)
+            if delay:
+                logger.info(f"Throttling Gemini request for {delay:.2f}s to stay within rate limits")
+                time.sleep(delay)
+            response = model.generate_content(self._contents(prompt, history), stream=True)
+            tracker = _JsonStreamTracker() if json_response else None
+            parts = []
+            for chunk in response:
+                try:
+                    parts.append(chunk.text)
+                except ValueError:
+                    # Chunks without text parts (e.g. finish/safety metadata only)
+                    continue
+                if tracker is not None and tracker.feed(parts[-1]):
+                    break
+            text = "".join(parts).strip()
+        except BaseException as e:
+            self._resolve_inflight(key, future, error=e)
+            raise
+        
+        self._resolve_inflight(key, future, result=text)
+        if response_cache is not None and self._should_store_response(text, json_response):
+            response_cache.set(key, text)
+        return text
+    
+    async def _acall(
+        self,
+        prompt: str,
+        model: Optional[Any] = None,
+        json_response: bool = False,
+        history: Optional[Sequence[Dict[str, Any]]] = None
+    ) -> str:
+        """
+        Call Gemini asynchronously with bounded concurrency and retries.
+        
+        Identical prompts already in flight (sync or async) are joined rather than re-sent;
+        concurrency is capped per event loop at GEMINI_MAX_CONCURRENCY.
+        
+        Args:
+            prompt: Prompt to send
+            model: Model to use instead of self.model (e.g. one bound to cached content)
+            json_response: Stop reading once a complete top-level JSON value has arrived
+            history: Fixed prior turns (e.g. few-shot examples) sent ahead of the prompt
+            
+        Returns:
+            Stripped response text
+            
+        Raises:
+            Exception: The last error if all retries fail
+        """
+        model = model or self.model
+        key = self._request_key(model, prompt, history)
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            cached = await asyncio.to_thread(response_cache.get, key)
+            if cached is not None:
+                logger.info("Gemini response served from disk cache")
+                return cached
+        
+        future, is_owner = self._claim_inflight(key)
+        if not is_owner:
+            logger.info("Joining in-flight Gemini request for identical prompt")
+            return await asyncio.wrap_future(future)
+        
+        semaphore = _loop_semaphore()
+        text = None
+        last_error = None
+        try:
+            for attempt in range(GEMINI_MAX_RETRIES + 1):
+                try:
+                    delay = _rate_limit_delay(prompt)
+                    if delay:
+                        logger.info(f"Throttling Gemini request for {delay:.2f}s to stay within rate limits")
+                        await asyncio.sleep(delay)
+                    async with semaphore:
+                        response = await model.generate_content_async(self._contents(prompt, history), stream=True)
+                        tracker = _JsonStreamTracker() if json_response else None
+                        parts = []
+                        async for chunk in response:
+                            try:
+                                parts.append(chunk.text)
+                            except ValueError:
+                                continue
+                            if tracker is not None and tracker.feed(parts[-1]):
+                                break
+                    text = "".join(parts).strip()
+                    break
+                except Exception as e:
+                    last_error = e
+                    if attempt < GEMINI_MAX_RETRIES:
+                        logger.warning(f"Gemini call failed (attempt {attempt + 1}), retrying: {e}")
+                        # Full jitter so concurrent callers don't retry (and hit 429s) in lockstep
+                        await asyncio.sleep(random.uniform(0, 0.5 * 2 ** (attempt + 1)))
+        except BaseException as e:
+            # Cancellation - don't leave waiters hanging
+            self._resolve_inflight(key, future, error=e)
+            raise
+        
+        if text is None:
+            self._resolve_inflight(key, future, error=last_error)
+            raise last_error
+        
+        self._resolve_inflight(key, future, result=text)
+        if response_cache is not None and self._should_store_response(text, json_response):
+            await asyncio.to_thread(response_cache.set, key, text)
+        return text
+    
+    def _build_extract_prompt(
+        self,
+        text: str,
+        existing_variables: Optional[List[Dict[str, Any]]] = None,
+        is_first_chunk: bool = True
+    ) -> Tuple[str, Optional[Any], str, Optional[Sequence[Dict[str, Any]]]]:
+        """
+        Pick the extraction prompt for a chunk and the model to send it to.
+        
+        Returns:
+            (prompt, model, cache_key, history) - model is bound to a cached preamble,
+            or None for self.model; cache_key identifies the prompt's variable slots
+            only; history holds fixed turns to send ahead of the prompt
+        """
+        if is_first_chunk or not existing_variables:
+            # Instructions and the worked example travel as fixed prior turns; the
+            # prompt itself is just the document text
+            cache_key = _content_key("initial", text)
+            payload = LegalDocumentPrompts.extract_variables_initial_payload(text)
+            cached_model = self._get_cached_model("extract", LegalDocumentPrompts.EXTRACT_PREAMBLE)
+            if cached_model is not None:
+                return payload, cached_model, cache_key, LegalDocumentPrompts.EXTRACT_FEW_SHOT_HISTORY
+            return payload, None, cache_key, LegalDocumentPrompts.EXTRACT_HISTORY
+        
+        # For subsequent chunks, provide existing variables
+        existing_vars_json = _json_dumps(existing_variables)
+        cache_key = _content_key("continuation", text, existing_vars_json)
+        cached_model = self._get_cached_model(
+            "extract_continuation", LegalDocumentPrompts.EXTRACT_CONTINUATION_PREAMBLE
+        )
+        if cached_model is not None:
+            return (
+                LegalDocumentPrompts.extract_variables_continuation_payload(text, existing_vars_json),
+                cached_model,
+                cache_key,
+                None
+            )
+        return LegalDocumentPrompts.extract_variables_continuation(text, existing_vars_json), None, cache_key, None
+    
+    def _cached_extraction(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of a cached extraction result, or None on a miss."""
+        with self._cache_lock:
+            cached = self._extract_cache.get(cache_key)
+        if cached is None:
+            return None
+        logger.info("Variable extraction cache hit for chunk")
+        return copy.deepcopy(cached)
+    
+    def _store_extraction(self, cache_key: str, result: Dict[str, Any]) -> None:
+        """Cache a parsed extraction result."""
+        with self._cache_lock:
+            self._extract_cache[cache_key] = copy.deepcopy(result)
+    
     def extract_variables_from_chunk(
         self, 
         text: str, 
@@ -31,30 +1082,24 @@ class GeminiService:
         is_first_chunk: bool = True
     ) -> Dict[str, Any]:
         
-        if is_first_chunk or not existing_variables:
-            prompt = LegalDocumentPrompts.extract_variables_initial(text)
-        else:
-            # For subsequent chunks, provide existing variables
-            existing_vars_json = json.dumps(existing_variables, indent=2)
-            prompt = LegalDocumentPrompts.extract_variables_continuation(text, existing_vars_json)
+        prompt, cached_model, cache_key, history = self._build_extract_prompt(text, existing_variables, is_first_chunk)
+        cached = self._cached_extraction(cache_key)
+        if cached is not None:
+            return cached
         
         try:
             logger.info("Calling Gemini API to extract variables from document chunk")
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Extract JSON from markdown code blocks if present
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
+            result_text = self._strip_fence(
+                self._generate_text(prompt, model=cached_model, json_response=True, history=history)
+            )
             
-            result = json.loads(result_text)
+            result = _json_loads(result_text)
+            self._store_extraction(cache_key, result)
             logger.info(f"Successfully extracted {len(result.get('variables', []))} variables")
             return result
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON from Gemini response: {e}")
-            logger.debug(f"Response text: {response.text[:500]}...")
+            logger.debug(f"Response text: {result_text[:500]}...")
             return {"variables": [], "similarity_tags": []}
         except Exception as e:
             logger.error(f"Error calling Gemini API for variable extraction: {e}")
@@ -89,41 +1134,127 @@ class GeminiService:
         try:
             logger.info(f"Generating template from text with {len(variables)} variables")
             
-            # Create a mapping of examples to variable keys
-            replacements = []
-            for var in variables:
-                    if not isinstance(var, dict):
-                        logger.warning(f"Skipping invalid variable: {var}")
-                        continue
-                        
-            if var.get("example"):
-                # Escape special regex characters in the example
-                example = re.escape(str(var.get("example")))
-                key = var.get("key")
-                if key:
-                    replacements.append((example, f"{{{{{key}}}}}"))
-        
-            # Sort by length (longest first) to avoid partial replacements
-            replacements.sort(key=lambda x: len(x[0]), reverse=True)
-            
-            template = text
-            replacements_made = 0
-            for example, placeholder in replacements:
-                # Use word boundaries for better matching
-                pattern = r'\b' + example + r'\b'
-                new_template = re.sub(pattern, placeholder, template, flags=re.IGNORECASE)
-                if new_template != template:
-                    replacements_made += 1
-                template = new_template
-                    
-                logger.info(f"Successfully generated template with {replacements_made} replacements")
-                return template
+            specs = _to_var_specs(variables)
+            if len(specs) != len(variables):
+                logger.warning(f"Skipping {len(variables) - len(specs)} invalid variables")
+            
+            # Normalized example -> placeholder, built in one pass
+            replacements = [
+                (_WHITESPACE_RE.sub(' ', str(spec.example).strip()).lower(), f"{{{{{spec.key}}}}}")
+                for spec in specs if spec.example
+            ]
+            # First variable wins when two share the same example
+            mapping = dict(reversed([pair for pair in replacements if pair[0]]))
+            
+            if not mapping:
+                logger.info("Successfully generated template with 0 replacements")
+                return text
+            
+            # The automaton only matches literal spacing, so use it for single-token examples only
+            single_token = not any(' ' in example for example in mapping)
+            if ahocorasick is not None and single_token:
+                template = _aho_corasick_replace(self._get_automaton(mapping), text)
+                if template is not None:
+                    logger.info("Successfully generated template using Aho-Corasick automaton")
+                    return template
+            
+            pattern = self._get_replacement_pattern(mapping)
+            
+            # Single pass over the text with one alternation pattern
+            matched_placeholders = set()
+            
+            def _replace(match):
+                placeholder = mapping.get(_WHITESPACE_RE.sub(' ', match.group(0)).lower())
+                if placeholder is None:
+                    return match.group(0)
+                matched_placeholders.add(placeholder)
+                return placeholder
+            
+            if regex is not None:
+                # Let other threads (e.g. concurrent uploads) run during the scan
+                template = pattern.sub(_replace, text, concurrent=True)
+            else:
+                template = pattern.sub(_replace, text)
+            
+            logger.info(f"Successfully generated template with {len(matched_placeholders)} replacements")
+            return template
             
         except Exception as e:
             logger.error(f"Error generating template from text: {e}")
             # Return original text if template generation fails
             return text
     
+    async def agenerate_template_from_text(
+        self, 
+        text: str, 
+        variables: List[Dict[str, Any]]
+    ) -> str:
+        """
+        Async variant of generate_template_from_text that runs the regex pass
+        on a worker thread so the event loop stays responsive.
+        """
+        return await asyncio.to_thread(self.generate_template_from_text, text, variables)
+    
+    def _cached_matcher(self, cache_key: Any, build: Callable[[], Any]) -> Any:
+        """
+        Get a compiled replacement matcher from the bounded cache, building it on a miss.
+        
+        Built outside the lock; two threads racing on the same key both build and
+        the last one stored wins, which is harmless.
+        """
+        with self._cache_lock:
+            matcher = self._replacement_patterns.get(cache_key)
+        if matcher is None:
+            matcher = build()
+            with self._cache_lock:
+                self._replacement_patterns[cache_key] = matcher
+        return matcher
+    
+    def _get_automaton(self, mapping: Dict[str, str]) -> Any:
+        """
+        Get (or build and cache) an Aho-Corasick automaton over all examples.
+        
+        Args:
+            mapping: Lowercased example values mapped to placeholders
+            
+        Returns:
+            ahocorasick.Automaton with (example length, placeholder) values
+        """
+        def build() -> Any:
+            automaton = ahocorasick.Automaton()
+            for example, placeholder in mapping.items():
+                automaton.add_word(example, (len(example), placeholder))
+            automaton.make_automaton()
+            return automaton
+        
+        return self._cached_matcher(("ahocorasick", frozenset(mapping.items())), build)
+    
+    def _get_replacement_pattern(self, mapping: Dict[str, str]) -> Any:
+        """
+        Get (or compile and cache) a single alternation pattern for all examples.
+        
+        Args:
+            mapping: Lowercased example values mapped to placeholders
+            
+        Returns:
+            Compiled case-insensitive pattern (regex module when available, else re)
+            matching any whole-token example
+        """
+        def build() -> Any:
+            # Longest first so longer examples win over their prefixes; any whitespace
+            # run in the text may stand in for the single space in a normalized example
+            alternation = "|".join(
+                r'\s+'.join(re.escape(word) for word in example.split(' '))
+                for example in sorted(mapping, key=len, reverse=True)
+            )
+            # Lookarounds rather than \b, which never matches before "$50,000" or after "99.9%"
+            source = r'(?<!\w)(?:' + alternation + r')(?!\w)'
+            if regex is not None:
+                return regex.compile(source, regex.IGNORECASE)
+            return re.compile(source, re.IGNORECASE)
+        
+        return self._cached_matcher(frozenset(mapping.items()), build)
+    
     def generate_template_body_intelligent(
         self,
         document_text: str,
@@ -154,25 +1285,27 @@ class GeminiService:
         try:
             logger.info(f"Generating template body with {len(variables)} variables")
             
-            prompt = LegalDocumentPrompts.generate_template_body(
-                document_text=document_text,
-                variables=variables
-            )
+            cached_model = self._get_cached_model("template_body", LegalDocumentPrompts.TEMPLATE_BODY_PREAMBLE)
+            if cached_model is not None:
+                # Static instructions live in the cache; send only the document and variables
+                prompt = LegalDocumentPrompts.generate_template_body_payload(document_text, variables)
+            else:
+                prompt = LegalDocumentPrompts.generate_template_body(
+                    document_text=document_text,
+                    variables=variables
+                )
             
-            response = self.model.generate_content(prompt)
+            template_body = self._generate_text(prompt, model=cached_model)
             
-            if not response or not response.text:
+            if not template_body:
                 logger.error("Empty response from Gemini API")
                 raise ValueError("Failed to generate template body - empty response")
             
-            template_body = response.text.strip()
             
-            # Remove markdown code blocks if present
-            if template_body.startswith("```"):
-                lines = template_body.split("\n")
-                if len(lines) > 2:
-                    # Remove first and last lines (code block delimiters)
-                    template_body = "\n".join(lines[1:-1]).strip()
+            # Remove a markdown code block wrapping the whole response, if present
+            match = _OUTER_FENCE_RE.match(template_body)
+            if match:
+                template_body = match.group(1).strip()
             
             logger.info(f"Successfully generated template body ({len(template_body)} chars)")
             return template_body
@@ -191,44 +1324,55 @@ class GeminiService:
         Returns:
             Dictionary with classification results
         """
+        cache_key = _content_key(document_text)
+        cached = self._cached_classification(cache_key)
+        if cached is not None:
+            return cached
+        
         prompt = LegalDocumentPrompts.classify_document_type(document_text)
         
         try:
             logger.info("Classifying document type...")
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
-            
-            result = json.loads(result_text)
-            
-            logger.info(f"Document classified as: {result.get('document_type', 'unknown')}")
-            return result
-            
+            result_text = self._generate_text(prompt, json_response=True)
+            return self._finish_classification(cache_key, result_text)
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON from document classification: {e}")
-            logger.debug(f"Response text: {response.text[:500]}...")
-            return {
-                "is_legal_document": True,  # Default to legal to be safe
-                "document_type": "unknown",
-                "suggested_legal_template": None,
-                "reasoning": "Failed to classify document",
-                "legal_jurisdiction": "US",
-                "conversion_notes": None
-            }
+            logger.debug(f"Response text: {result_text[:500]}...")
+            return self._default_classification("Failed to classify document")
         except Exception as e:
             logger.error(f"Error in document classification: {e}")
-            return {
-                "is_legal_document": True,  # Default to legal to be safe
-                "document_type": "unknown", 
-                "suggested_legal_template": None,
-                "reasoning": f"Classification error: {str(e)}",
-                "legal_jurisdiction": "US",
-                "conversion_notes": None
-            }
+            return self._default_classification(f"Classification error: {str(e)}")
+    
+    def _cached_classification(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of a cached classification, or None on a miss."""
+        with self._cache_lock:
+            cached = self._classify_cache.get(cache_key)
+        if cached is None:
+            return None
+        logger.info(f"Document classification cache hit: {cached.get('document_type', 'unknown')}")
+        return copy.deepcopy(cached)
+    
+    def _finish_classification(self, cache_key: str, result_text: str) -> Dict[str, Any]:
+        """Parse and cache a Gemini classification response."""
+        result = _json_loads(self._strip_fence(result_text))
+        
+        with self._cache_lock:
+            self._classify_cache[cache_key] = copy.deepcopy(result)
+        
+        logger.info(f"Document classified as: {result.get('document_type', 'unknown')}")
+        return result
+    
+    @staticmethod
+    def _default_classification(reasoning: str) -> Dict[str, Any]:
+        """Fallback classification used when Gemini can't classify a document."""
+        return {
+            "is_legal_document": True,  # Default to legal to be safe
+            "document_type": "unknown",
+            "suggested_legal_template": None,
+            "reasoning": reasoning,
+            "legal_jurisdiction": "US",
+            "conversion_notes": None
+        }
     
     def generate_legal_template_from_business_need(
         self,
@@ -237,209 +1381,609 @@ class GeminiService:
         jurisdiction: str = "US"
     ) -> str:
         """
-        Generate a legal template from a business need description.
+        Generate a legal template from a business need description.
+        
+        Args:
+            business_description: Description of the business need
+            suggested_template_type: Type of legal document to create
+            jurisdiction: Legal jurisdiction
+            
+        Returns:
+            Generated legal template text
+        """
+        prompt = LegalDocumentPrompts.generate_legal_template_from_business_need(
+            business_description, suggested_template_type, jurisdiction
+        )
+        
+        try:
+            logger.info(f"Generating legal template from business need: {suggested_template_type}")
+            result_text = self._strip_fence(self._generate_text(prompt))
+            
+            logger.info("Successfully generated legal template from business need")
+            return result_text
+            
+        except Exception as e:
+            logger.error(f"Error generating legal template from business need: {e}")
+            raise ValueError(f"Failed to generate legal template: {str(e)}")
+    
+    def find_matching_template(
+        self, 
+        user_query: str, 
+        templates: List[Dict[str, Any]],
+        query_embedding: Optional[Sequence[float]] = None
+    ) -> Dict[str, Any]:
+        """
+        Use Gemini to classify and find the best matching template
+        
+        When every candidate carries a semantic_similarity score (from the
+        embedding shortlist), a top score of at least MATCH_DIRECT_THRESHOLD is
+        accepted directly; otherwise only the MATCH_RERANK_TOP_K best candidates
+        are sent to Gemini.
+        
+        Passing the query's embedding also lets a paraphrase of an earlier query
+        (cosine >= MATCH_SEMANTIC_CACHE_THRESHOLD) against the same candidates
+        reuse that query's match.
+        """
+        result, cache_key, prompt, semantic_key = self._prepare_match(user_query, templates, query_embedding)
+        if result is not None:
+            return result
+        
+        try:
+            logger.info(f"Finding matching template for query: {user_query[:100]}...")
+            result_text = self._generate_text(prompt, json_response=True)
+            return self._finish_match(cache_key, result_text, semantic_key)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse JSON from Gemini template matching response: {e}")
+            logger.debug(f"Response text: {result_text[:500]}...")
+            return {"top_match": None, "alternatives": [], "found": False}
+        except Exception as e:
+            logger.error(f"Error in template matching: {e}")
+            return {"top_match": None, "alternatives": [], "found": False}
+    
+    async def afind_matching_template(
+        self, 
+        user_query: str, 
+        templates: List[Dict[str, Any]],
+        query_embedding: Optional[Sequence[float]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of find_matching_template, for use from async handlers.
+        """
+        result, cache_key, prompt, semantic_key = self._prepare_match(user_query, templates, query_embedding)
+        if result is not None:
+            return result
+        
+        try:
+            logger.info(f"Finding matching template for query: {user_query[:100]}...")
+            result_text = await self._acall(prompt, json_response=True)
+            return self._finish_match(cache_key, result_text, semantic_key)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse JSON from Gemini template matching response: {e}")
+            logger.debug(f"Response text: {result_text[:500]}...")
+            return {"top_match": None, "alternatives": [], "found": False}
+        except Exception as e:
+            logger.error(f"Error in template matching: {e}")
+            return {"top_match": None, "alternatives": [], "found": False}
+    
+    def _prepare_match(
+        self, 
+        user_query: str, 
+        templates: List[Dict[str, Any]],
+        query_embedding: Optional[Sequence[float]] = None
+    ) -> Tuple[Optional[Dict[str, Any]], str, Optional[str], Optional[Tuple[str, np.ndarray]]]:
+        """
+        Resolve a template match without Gemini where possible.
+        
+        Returns:
+            (result, cache_key, prompt, semantic_key) - result is set on a semantic
+            shortcut or cache hit, otherwise prompt holds the request to send;
+            semantic_key is (candidate-set key, unit query embedding) when an
+            embedding was given
+        """
+        if templates and all(t.get("semantic_similarity") is not None for t in templates):
+            ranked = sorted(templates, key=lambda t: t["semantic_similarity"], reverse=True)
+            if ranked[0]["semantic_similarity"] >= MATCH_DIRECT_THRESHOLD:
+                logger.info(
+                    f"Semantic match {ranked[0]['semantic_similarity']:.3f} above threshold, skipping Gemini re-ranking"
+                )
+                return self._semantic_match_result(ranked), "", None, None
+            templates = ranked[:MATCH_RERANK_TOP_K]
+        else:
+            # Scored over every candidate before shortlisting: IDF fit on just a
+            # handful of templates inflates the scores
+            local_ranking = _local_match_ranking(user_query, templates)
+            if _local_match_accepted(local_ranking):
+                logger.info(f"Local match score {local_ranking[0][0]:.3f} above threshold, skipping Gemini re-ranking")
+                return self._semantic_match_result(
+                    [{**t, "semantic_similarity": score} for score, t in local_ranking]
+                ), "", None, None
+            if len(templates) > MATCH_LEXICAL_TOP_K:
+                templates = _lexical_shortlist(user_query, templates, MATCH_LEXICAL_TOP_K)
+        
+        templates_info = []
+        for t in templates:
+            templates_info.append({
+                "template_id": t["template_id"],
+                "title": t["title"],
+                "description": t.get("file_description", ""),
+                "doc_type": t.get("doc_type", ""),
+                "jurisdiction": t.get("jurisdiction", ""),
+                "tags": t.get("similarity_tags", [])
+            })
+        
+        templates_json = _json_dumps(templates_info)
+        
+        # Key on the normalized query so casing/spacing variants share a cached match
+        cache_key = _content_key(_WHITESPACE_RE.sub(" ", user_query).strip().casefold(), templates_json)
+        with self._cache_lock:
+            cached = self._match_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Template match cache hit for query: {user_query[:100]}...")
+            return copy.deepcopy(cached), cache_key, None, None
+        
+        semantic_key = None
+        if query_embedding is not None:
+            vector = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                semantic_key = (_content_key(templates_json), vector / norm)
+                cached = self._lookup_semantic_match(*semantic_key)
+                if cached is not None:
+                    logger.info(f"Semantic match cache hit for query: {user_query[:100]}...")
+                    return cached, cache_key, None, None
+        
+        return None, cache_key, LegalDocumentPrompts.find_matching_template(user_query, templates_json), semantic_key
+    
+    def _lookup_semantic_match(self, set_key: str, vector: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached match for a near-duplicate query against the same candidate set.
+        
+        The candidate set is the bucket: paraphrases shortlist the same templates,
+        so only the few queries seen for that set are compared.
+        """
+        with self._cache_lock:
+            entries = self._match_semantic_cache.get(set_key)
+            if not entries:
+                return None
+            vectors = np.stack([entry[0] for entry in entries])
+            scores = vectors @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < MATCH_SEMANTIC_CACHE_THRESHOLD:
+                return None
+            return copy.deepcopy(entries[best][1])
+    
+    def _finish_match(
+        self, 
+        cache_key: str, 
+        result_text: str, 
+        semantic_key: Optional[Tuple[str, np.ndarray]] = None
+    ) -> Dict[str, Any]:
+        """Parse and cache a Gemini template match response."""
+        result = _json_loads(self._strip_fence(result_text))
+        
+        with self._cache_lock:
+            self._match_cache[cache_key] = copy.deepcopy(result)
+            if semantic_key is not None:
+                set_key, vector = semantic_key
+                entries = self._match_semantic_cache.get(set_key) or []
+                entries.append((vector, copy.deepcopy(result)))
+                self._match_semantic_cache[set_key] = entries[-MATCH_SEMANTIC_CACHE_PER_SET:]
+        
+        if result.get("found"):
+            logger.info(f"Found matching template with confidence: {result['top_match'].get('confidence', 0)}")
+        else:
+            logger.info("No matching template found")
+        
+        return result
+    
+    @staticmethod
+    def _semantic_match_result(ranked: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Build a find_matching_template result straight from similarity scores.
+        
+        Args:
+            ranked: Candidate templates sorted by semantic_similarity, highest first
+            
+        Returns:
+            Match result in the same shape Gemini returns
+        """
+        def _entry(t: Dict[str, Any], explanation: str) -> Dict[str, Any]:
+            return {
+                "template_id": t["template_id"],
+                "title": t["title"],
+                "confidence": round(float(t["semantic_similarity"]), 3),
+                "explanation": explanation,
+                "doc_type": t.get("doc_type"),
+                "jurisdiction": t.get("jurisdiction")
+            }
+        
+        return {
+            "top_match": _entry(ranked[0], "Closest semantic match to the request"),
+            "alternatives": [
+                _entry(t, "Also semantically similar to the request")
+                for t in ranked[1:MATCH_RERANK_TOP_K]
+                if t["semantic_similarity"] >= MATCH_MIN_CONFIDENCE
+            ],
+            "found": True
+        }
+    
+    def generate_questions_from_variables(
+        self, 
+        variables: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Convert variable metadata into human-friendly questions.
+        
+        Alias of generate_questions_batch.
+        """
+        return self.generate_questions_batch(variables)
+    
+    async def agenerate_questions_from_variables(
+        self, 
+        variables: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Async alias of generate_questions_batch, for use from async handlers.
+        """
+        return await self.agenerate_questions_batch(variables)
+
+    def extract_variables_and_generate_template_combined(
+        self, 
+        document_text: str
+    ) -> Dict[str, Any]:
+        """
+        OPTIMIZED: Single API call that extracts variables, generates template body, and creates questions
+        
+        Args:
+            document_text: Raw document text
+            
+        Returns:
+            Dictionary with variables, template_body, and questions
+        """
+        logger.info("Starting combined variable extraction, template generation, and question creation")
+        
+        prompt = LegalDocumentPrompts.extract_variables_and_generate_template_combined(
+            document_text, self._combined_hints_json(document_text)
+        )
+        
+        try:
+            result_text = self._strip_fence(self._generate_text(prompt, json_response=True))
+            
+            result = _json_loads(result_text)
+            
+            logger.info(f"Combined processing completed: {len(result.get('variables', []))} variables extracted")
+            return result
+            
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse JSON from combined processing: {e}")
+            logger.debug(f"Response text: {result_text[:500]}...")
+            raise ValueError(f"Failed to parse combined processing result: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error in combined processing: {e}")
+            raise ValueError(f"Combined processing failed: {str(e)}")
+
+    @staticmethod
+    def _combined_hints_json(document_text: str) -> str:
+        """Pre-extracted candidate values for the combined prompt, as JSON ("" if none)."""
+        hints = _document_hints(document_text)
+        return _json_dumps(hints) if hints else ""
+    
+    def extract_variables_and_generate_template_combined_chunks(self, chunks: List[str]) -> Dict[str, Any]:
+        """
+        Combined processing of a document split into chunks, one concurrent call per chunk.
+        
+        Synchronous wrapper around aextract_variables_and_generate_template_combined_chunks,
+        for sync callers only (e.g. a worker thread); async callers await that directly.
+        
+        Args:
+            chunks: Document text split into chunks on paragraph boundaries
+            
+        Returns:
+            Merged result (same shape as extract_variables_and_generate_template_combined)
+        """
+        if len(chunks) == 1:
+            return self.extract_variables_and_generate_template_combined(chunks[0])
+        return _run_sync(self.aextract_variables_and_generate_template_combined_chunks(chunks))
+    
+    async def aextract_variables_and_generate_template_combined_chunks(self, chunks: List[str]) -> Dict[str, Any]:
+        """
+        Run the combined prompt on every chunk concurrently and merge the results.
+        
+        Variables and questions are merged by key (first occurrence wins), template
+        bodies are joined in chunk order, similarity tags are unioned, and the
+        remaining document metadata comes from the first chunk.
         
         Args:
-            business_description: Description of the business need
-            suggested_template_type: Type of legal document to create
-            jurisdiction: Legal jurisdiction
+            chunks: Document text split into chunks on paragraph boundaries
             
         Returns:
-            Generated legal template text
+            Merged result (same shape as extract_variables_and_generate_template_combined)
+            
+        Raises:
+            ValueError: If any chunk fails or its response cannot be parsed
         """
-        prompt = LegalDocumentPrompts.generate_legal_template_from_business_need(
-            business_description, suggested_template_type, jurisdiction
-        )
+        logger.info(f"Starting combined processing of {len(chunks)} chunks concurrently")
+        
+        async def _process(chunk: str) -> Dict[str, Any]:
+            prompt = LegalDocumentPrompts.extract_variables_and_generate_template_combined(
+                chunk, self._combined_hints_json(chunk)
+            )
+            text = await self._acall(prompt, json_response=True)
+            return await asyncio.to_thread(self._parse_json_response, text)
         
         try:
-            logger.info(f"Generating legal template from business need: {suggested_template_type}")
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            if "```yaml" in result_text:
-                result_text = result_text.split("```yaml")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
-            
-            logger.info("Successfully generated legal template from business need")
-            return result_text
-            
+            results = await asyncio.gather(*(_process(chunk) for chunk in chunks))
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse JSON from combined processing: {e}")
+            raise ValueError(f"Failed to parse combined processing result: {str(e)}")
         except Exception as e:
-            logger.error(f"Error generating legal template from business need: {e}")
-            raise ValueError(f"Failed to generate legal template: {str(e)}")
+            logger.error(f"Error in combined processing: {e}")
+            raise ValueError(f"Combined processing failed: {str(e)}")
+        
+        merged = dict(results[0])
+        variables: Dict[str, Dict[str, Any]] = {}
+        questions: Dict[str, Dict[str, Any]] = {}
+        tags: Dict[str, None] = {}
+        for result in results:
+            for var in result.get("variables") or []:
+                if isinstance(var, dict) and var.get("key"):
+                    variables.setdefault(var["key"], var)
+            for question in result.get("questions") or []:
+                if isinstance(question, dict) and question.get("key"):
+                    questions.setdefault(question["key"], question)
+            tags.update(dict.fromkeys(result.get("similarity_tags") or []))
+        
+        merged["variables"] = list(variables.values())
+        merged["questions"] = list(questions.values())
+        merged["similarity_tags"] = list(tags)
+        merged["template_body"] = "\n\n".join(
+            result["template_body"] for result in results if result.get("template_body")
+        )
+        
+        logger.info(f"Combined processing completed: {len(variables)} variables extracted from {len(chunks)} chunks")
+        return merged
     
-    def find_matching_template(
-        self, 
-        user_query: str, 
-        templates: List[Dict[str, Any]]
-    ) -> Dict[str, Any]:
+    def full_ingest(self, document_text: str) -> Dict[str, Any]:
         """
-        Use Gemini to classify and find the best matching template
+        Single API call covering the whole intake: classification, variable extraction,
+        template body generation and question creation.
+        
+        Args:
+            document_text: Raw document text
+            
+        Returns:
+            Dictionary with classification, variables, template_body, questions
+            and template metadata (similarity_tags, doc_type, jurisdiction, ...)
+            
+        Raises:
+            ValueError: If the call fails or the response cannot be parsed
         """
-        templates_info = []
-        for t in templates:
-            templates_info.append({
-                "template_id": t["template_id"],
-                "title": t["title"],
-                "description": t.get("file_description", ""),
-                "doc_type": t.get("doc_type", ""),
-                "jurisdiction": t.get("jurisdiction", ""),
-                "tags": t.get("similarity_tags", [])
-            })
+        logger.info("Starting full ingest (classification, variables, template body, questions)")
         
-        templates_json = json.dumps(templates_info, indent=2)
-        prompt = LegalDocumentPrompts.find_matching_template(user_query, templates_json)
+        prompt = LegalDocumentPrompts.full_ingest(
+            document_text, self._combined_hints_json(document_text)
+        )
         
         try:
-            logger.info(f"Finding matching template for query: {user_query[:100]}...")
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
+            result_text = self._strip_fence(self._generate_text(prompt, json_response=True))
             
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
+            result = _json_loads(result_text)
             
-            result = json.loads(result_text)
+            classification = result.get("classification")
+            if not isinstance(classification, dict):
+                raise ValueError("Response is missing the classification object")
             
-            if result.get("found"):
-                logger.info(f"Found matching template with confidence: {result['top_match'].get('confidence', 0)}")
-            else:
-                logger.info("No matching template found")
+            # Seed the classification cache so a later classify_document_type call is free
+            with self._cache_lock:
+                self._classify_cache[_content_key(document_text)] = copy.deepcopy(classification)
             
+            logger.info(
+                f"Full ingest completed: classified as {classification.get('document_type', 'unknown')}, "
+                f"{len(result.get('variables', []))} variables extracted"
+            )
             return result
+            
         except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON from Gemini template matching response: {e}")
-            logger.debug(f"Response text: {response.text[:500]}...")
-            return {"top_match": None, "alternatives": [], "found": False}
+            logger.error(f"Failed to parse JSON from full ingest: {e}")
+            logger.debug(f"Response text: {result_text[:500]}...")
+            raise ValueError(f"Failed to parse full ingest result: {str(e)}")
         except Exception as e:
-            logger.error(f"Error in template matching: {e}")
-            return {"top_match": None, "alternatives": [], "found": False}
-    
-    def generate_questions_from_variables(
-        self, 
+            logger.error(f"Error in full ingest: {e}")
+            raise ValueError(f"Full ingest failed: {str(e)}")
+
+    def _lookup_cached_questions(
+        self,
         variables: List[Dict[str, Any]]
-    ) -> List[Dict[str, Any]]:
+    ) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]], Dict[str, str]]:
         """
-        Convert variable metadata into human-friendly questions
+        Render questions for variables whose structural pattern was seen before,
+        or from the dtype templates when QUESTION_TEMPLATES_ENABLED.
+        
+        Of the variables left for the LLM, only the first with a given (label,
+        description, dtype) is sent; the others reuse its question.
         
         Args:
             variables: List of variable definitions
             
         Returns:
-            List of question dictionaries with keys, questions, and metadata
+            (questions by variable key, variables still needing the LLM,
+            duplicate variable key -> key of the variable whose question it reuses)
         """
-        if not variables:
-            logger.warning("No variables provided for question generation")
-            return []
+        cached: Dict[str, Dict[str, Any]] = {}
+        pending: List[Dict[str, Any]] = []
+        duplicates: Dict[str, str] = {}
+        representatives: Dict[Tuple[str, str, str], str] = {}
+        seen_keys: Set[str] = set()
+        templated = 0
+        with self._cache_lock:
+            for var in variables:
+                spec = VarSpec.from_dict(var) if isinstance(var, dict) and var.get("key") else None
+                if spec is None:
+                    pending.append(var)
+                    continue
+                if spec.key in seen_keys:
+                    # Questions are keyed by variable key, so a repeated key is already covered
+                    continue
+                seen_keys.add(spec.key)
+                
+                pattern_key = _question_pattern_key(spec)
+                entry = self._question_cache.get(pattern_key) if pattern_key else None
+                if entry is not None:
+                    template, lowercase = entry
+                    label = _spec_label(spec)
+                    cached[spec.key] = spec.to_question(
+                        template.replace(_LABEL_TOKEN, label.lower() if lowercase else label)
+                    )
+                    continue
+                
+                question = _template_question(spec) if QUESTION_TEMPLATES_ENABLED else None
+                if question is None:
+                    content_key = (
+                        _spec_label(spec).strip().casefold(),
+                        (spec.description or "").strip().casefold(),
+                        spec.dtype or "string"
+                    )
+                    representative = representatives.setdefault(content_key, spec.key)
+                    if representative == spec.key:
+                        pending.append(var)
+                    else:
+                        duplicates[spec.key] = representative
+                    continue
+                cached[spec.key] = spec.to_question(question)
+                templated += 1
         
-        if not isinstance(variables, list):
-            logger.error(f"variables must be a list, got {type(variables)}")
-            return []
+        if cached:
+            logger.info(
+                f"Reused {len(cached) - templated} structurally cached questions, "
+                f"built {templated} from dtype templates"
+            )
+        if duplicates:
+            logger.info(f"{len(duplicates)} variables share a question with an identical variable")
+        return cached, pending, duplicates
+    
+    def _learn_question_patterns(
+        self,
+        variables: List[Dict[str, Any]],
+        questions: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Store LLM-generated questions as label-agnostic templates.
         
-        logger.info(f"Generating questions for {len(variables)} variables")
-        questions = []
+        Only questions that contain the variable's label verbatim are stored;
+        otherwise the label can't be swapped reliably.
+        """
+        if not isinstance(questions, list):
+            return
         
-        for idx, var in enumerate(variables, start=1):
-            if not isinstance(var, dict):
-                logger.warning(f"Skipping invalid variable at index {idx}: {var}")
-                continue
-            
-            try:
-                if not var.get("key") or not var.get("label"):
-                    logger.warning(f"Variable at index {idx} missing key or label, skipping")
+        specs = {spec.key: spec for spec in _to_var_specs(variables)}
+        with self._cache_lock:
+            for question in questions:
+                if not isinstance(question, dict):
+                    continue
+                spec = specs.get(question.get("key"))
+                text = question.get("question")
+                if spec is None or not isinstance(text, str):
+                    continue
+                pattern_key = _question_pattern_key(spec)
+                label = _spec_label(spec)
+                start = text.lower().find(label.lower())
+                if pattern_key is None or start < 0:
                     continue
                 
-                # Generate prompt for this variable
-                prompt = LegalDocumentPrompts.generate_question_from_variable(
-                    key=var['key'],
-                    label=var['label'],
-                    description=var.get('description', ''),
-                    example=var.get('example', ''),
-                    dtype=var.get('dtype', 'string')
-                )
-                
-                response = self.model.generate_content(prompt)
-                question_text = response.text.strip()
-                
-                questions.append({
-                    "key": var["key"],
-                    "question": question_text,
-                    "description": var.get("description"),
-                    "example": var.get("example"),
-                    "required": var.get("required", False),
-                    "dtype": var.get("dtype", "string"),
-                    "regex": var.get("regex"),
-                    "enum_values": var.get("enum_values")
-                })
-                logger.debug(f"Generated question for variable: {var['key']}")
-                
-            except Exception as e:
-                # Fallback to simple question
-                logger.warning(f"Error generating question for variable {var.get('key', 'unknown')}: {e}. Using fallback.")
-            try:
-                question_text = f"What is the {var['label'].lower()}?"
-                questions.append({
-                    "key": var["key"],
-                    "question": question_text,
-                    "description": var.get("description"),
-                    "example": var.get("example"),
-                    "required": var.get("required", False),
-                    "dtype": var.get("dtype", "string")
-                })
-            except Exception as e2:
-                logger.error(f"Failed to create fallback question for variable: {e2}")
-                continue
+                matched = text[start:start + len(label)]
+                template = text[:start] + _LABEL_TOKEN + text[start + len(label):]
+                self._question_cache[pattern_key] = (template, matched == label.lower() != label)
+    
+    @staticmethod
+    def _merge_questions(
+        variables: List[Dict[str, Any]],
+        cached: Dict[str, Dict[str, Any]],
+        generated: List[Dict[str, Any]],
+        duplicates: Optional[Dict[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Combine cached and generated questions, in variable order.
         
-        logger.info(f"Successfully generated {len(questions)} questions")
-        return questions
-
-    def extract_variables_and_generate_template_combined(
+        Variables in duplicates get the question generated for their
+        representative, rebuilt with their own key and metadata.
+        """
+        if not cached and not duplicates:
+            return generated
+        
+        generated_by_key = {q.get("key"): q for q in generated if isinstance(q, dict)}
+        representative_questions = dict(generated_by_key)
+        merged = []
+        for var in variables:
+            key = var.get("key") if isinstance(var, dict) else None
+            question = cached.get(key) or generated_by_key.pop(key, None)
+            if question is None and duplicates and key in duplicates:
+                source = representative_questions.get(duplicates[key])
+                if source is not None and source.get("question"):
+                    question = VarSpec.from_dict(var).to_question(source["question"])
+            if question is not None:
+                merged.append(question)
+        # Keep anything the LLM returned under an unexpected key
+        merged.extend(generated_by_key.values())
+        return merged
+    
+    def generate_questions_batch(
         self, 
-        document_text: str
-    ) -> Dict[str, Any]:
+        variables: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
         """
-        OPTIMIZED: Single API call that extracts variables, generates template body, and creates questions
+        OPTIMIZED: Generate all questions in a single API call instead of individual calls
+        
+        Variables structurally identical to ones seen before (same dtype and
+        description pattern) reuse the earlier question with their own label.
+        Sync callers only; async callers use agenerate_questions_batch.
         
         Args:
-            document_text: Raw document text
+            variables: List of variable definitions
             
         Returns:
-            Dictionary with variables, template_body, and questions
+            List of question dictionaries
         """
-        logger.info("Starting combined variable extraction, template generation, and question creation")
+        if not variables:
+            logger.warning("No variables provided for batch question generation")
+            return []
+        
+        cached, pending, duplicates = self._lookup_cached_questions(variables)
+        if not pending:
+            return self._merge_questions(variables, cached, [], duplicates)
+        
+        if len(pending) > GEMINI_QUESTION_BATCH_SIZE:
+            generated = _run_sync(self._agenerate_question_groups(pending))
+            return self._merge_questions(variables, cached, generated, duplicates)
         
-        prompt = LegalDocumentPrompts.extract_variables_and_generate_template_combined(document_text)
+        logger.info(f"Generating questions for {len(pending)} variables in batch")
+        
+        prompt = LegalDocumentPrompts.generate_questions_batch(pending)
         
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Parse JSON response
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
+            result_text = self._strip_fence(self._generate_text(prompt, json_response=True))
             
-            result = json.loads(result_text)
+            questions = _json_loads(result_text)
+            self._learn_question_patterns(pending, questions)
             
-            logger.info(f"Combined processing completed: {len(result.get('variables', []))} variables extracted")
-            return result
+            logger.info(f"Successfully generated {len(questions)} questions in batch")
+            return self._merge_questions(variables, cached, questions, duplicates)
             
         except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON from combined processing: {e}")
-            logger.debug(f"Response text: {response.text[:500]}...")
-            raise ValueError(f"Failed to parse combined processing result: {str(e)}")
+            logger.error(f"Failed to parse JSON from batch question generation: {e}")
+            logger.debug(f"Response text: {result_text[:500]}...")
+            logger.warning("Falling back to label-based questions")
+            return self._merge_questions(variables, cached, _fallback_questions(pending), duplicates)
         except Exception as e:
-            logger.error(f"Error in combined processing: {e}")
-            raise ValueError(f"Combined processing failed: {str(e)}")
-
-    def generate_questions_batch(
+            logger.error(f"Error in batch question generation: {e}")
+            logger.warning("Falling back to label-based questions")
+            return self._merge_questions(variables, cached, _fallback_questions(pending), duplicates)
+    
+    async def agenerate_questions_batch(
         self, 
         variables: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
         """
-        OPTIMIZED: Generate all questions in a single API call instead of individual calls
+        Async variant of generate_questions_batch.
         
         Args:
             variables: List of variable definitions
@@ -451,36 +1995,55 @@ class GeminiService:
             logger.warning("No variables provided for batch question generation")
             return []
         
-        logger.info(f"Generating questions for {len(variables)} variables in batch")
+        cached, pending, duplicates = self._lookup_cached_questions(variables)
+        generated = await self._agenerate_question_groups(pending) if pending else []
+        return self._merge_questions(variables, cached, generated, duplicates)
+    
+    async def _agenerate_question_groups(
+        self, 
+        variables: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate questions with one concurrent API call per group of variables.
         
-        prompt = LegalDocumentPrompts.generate_questions_batch(variables)
+        Variable sets larger than GEMINI_QUESTION_BATCH_SIZE are split into groups
+        that are sent concurrently; a failed group falls back to label-based
+        questions without affecting the others.
         
-        try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Parse JSON response
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
-            
-            questions = json.loads(result_text)
+        Args:
+            variables: List of variable definitions
             
-            logger.info(f"Successfully generated {len(questions)} questions in batch")
+        Returns:
+            List of question dictionaries
+        """
+        logger.info(f"Generating questions for {len(variables)} variables in batch")
+        
+        groups = [
+            variables[i:i + GEMINI_QUESTION_BATCH_SIZE]
+            for i in range(0, len(variables), GEMINI_QUESTION_BATCH_SIZE)
+        ]
+        
+        async def _generate(group: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            prompt = LegalDocumentPrompts.generate_questions_batch(group)
+            text = await self._acall(prompt, json_response=True)
+            # Keep the CPU-bound parse off the event loop
+            questions = await asyncio.to_thread(self._parse_json_response, text)
+            self._learn_question_patterns(group, questions)
             return questions
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON from batch question generation: {e}")
-            logger.debug(f"Response text: {response.text[:500]}...")
-            # Fallback to individual generation
-            logger.warning("Falling back to individual question generation")
-            return self.generate_questions_from_variables(variables)
-        except Exception as e:
-            logger.error(f"Error in batch question generation: {e}")
-            # Fallback to individual generation
-            logger.warning("Falling back to individual question generation")
-            return self.generate_questions_from_variables(variables)
+        
+        results = await asyncio.gather(*(_generate(group) for group in groups), return_exceptions=True)
+        
+        questions = []
+        for group, result in zip(groups, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Error in batch question generation: {result}")
+                logger.warning("Falling back to label-based questions")
+                questions.extend(_fallback_questions(group))
+            else:
+                questions.extend(result)
+        
+        logger.info(f"Successfully generated {len(questions)} questions in {len(groups)} batch(es)")
+        return questions
     
     def prefill_variables_from_query(
         self, 
@@ -497,61 +2060,173 @@ class GeminiService:
         Returns:
             Dictionary mapping variable keys to extracted values with confidence scores
         """
+        local_result, remaining = self._prepare_prefill(user_query, variables)
+        if not remaining:
+            return local_result
+        
+        try:
+            prompt = LegalDocumentPrompts.prefill_variables(user_query, self._get_prefill_variables_info(remaining))
+            result_text = self._generate_text(prompt, json_response=True)
+            return self._finish_prefill(result_text, remaining, local_result)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse JSON from Gemini prefill response: {e}")
+            logger.debug(f"Response text: {result_text[:500] if 'result_text' in locals() else 'N/A'}...")
+            return local_result
+        except Exception as e:
+            logger.error(f"Error in prefilling variables: {e}")
+            return local_result
+    
+    async def aprefill_variables_from_query(
+        self, 
+        user_query: str, 
+        variables: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Async variant of prefill_variables_from_query, for use from async handlers.
+        """
+        local_result, remaining = self._prepare_prefill(user_query, variables)
+        if not remaining:
+            return local_result
+        
+        try:
+            prompt = LegalDocumentPrompts.prefill_variables(user_query, self._get_prefill_variables_info(remaining))
+            result_text = await self._acall(prompt, json_response=True)
+            return self._finish_prefill(result_text, remaining, local_result)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse JSON from Gemini prefill response: {e}")
+            logger.debug(f"Response text: {result_text[:500] if 'result_text' in locals() else 'N/A'}...")
+            return local_result
+        except Exception as e:
+            logger.error(f"Error in prefilling variables: {e}")
+            return local_result
+    
+    def _prepare_prefill(
+        self, 
+        user_query: str, 
+        variables: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Validate prefill input and resolve trivially extractable fields locally.
+        
+        Returns:
+            (local_result, remaining) - remaining lists the variables still needing
+            Gemini, empty when there is nothing left to ask
+        """
         if not user_query or not user_query.strip():
             logger.info("Empty query provided for prefilling")
-            return {}
+            return {}, []
         
         if not variables:
             logger.info("No variables provided for prefilling")
-            return {}
+            return {}, []
         
         if not isinstance(variables, list):
             logger.error(f"variables must be a list, got {type(variables)}")
-            return {}
+            return {}, []
         
-        try:
-            logger.info(f"Attempting to prefill {len(variables)} variables from user query")
-            
-            # Enhanced variable info with enum values and regex patterns
-            variables_info = json.dumps([{
-                "key": v.get("key"),
-                "label": v.get("label"),
-                "description": v.get("description"),
-                "dtype": v.get("dtype", "string"),
-                "regex": v.get("regex"),
-                "enum_values": v.get("enum_values"),
-                "required": v.get("required", False)
-            } for v in variables if isinstance(v, dict) and v.get("key")], indent=2)
-            
-            prompt = LegalDocumentPrompts.prefill_variables(user_query, variables_info)
-            
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
-            
-            result = json.loads(result_text)
-            
-            # Validate and clean the results
-            validated_result = self._validate_prefilled_values(result, variables)
+        logger.info(f"Attempting to prefill {len(variables)} variables from user query")
+        
+        # Resolve trivially extractable fields locally; only the rest need the LLM
+        local_result = self._validate_prefilled_values(
+            self._extract_prefill_locally(user_query, variables), variables
+        )
+        if not local_result:
+            return local_result, variables
+        
+        remaining = [v for v in variables if not (isinstance(v, dict) and v.get("key") in local_result)]
+        logger.info(f"Prefilled {len(local_result)} variables locally, {len(remaining)} left for Gemini")
+        return local_result, remaining
+    
+    def _finish_prefill(
+        self, 
+        result_text: str, 
+        remaining: List[Dict[str, Any]], 
+        local_result: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Parse, validate and merge a Gemini prefill response with the local results."""
+        result = _json_loads(self._strip_fence(result_text))
+        
+        # Validate and clean the results
+        validated_result = self._validate_prefilled_values(result, remaining)
+        validated_result.update(local_result)
+        
+        if validated_result:
+            logger.info(f"Successfully prefilled {len(validated_result)} variables from query")
+        else:
+            logger.info("No variables could be prefilled from query")
+        
+        return validated_result
+    
+    @staticmethod
+    def _extract_prefill_locally(user_query: str, variables: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Extract dates, emails, phone numbers and currency amounts with regexes.
+        
+        A value is assigned only when exactly one variable has the dtype and the
+        query contains exactly one distinct value for it; anything ambiguous is
+        left for the LLM.
+        
+        Args:
+            user_query: User's input text
+            variables: List of variable definitions
             
-            if validated_result:
-                logger.info(f"Successfully prefilled {len(validated_result)} variables from query")
+        Returns:
+            Raw extracted values keyed by variable key (not yet validated)
+        """
+        keys_by_dtype: Dict[str, List[str]] = {}
+        for var in variables:
+            if isinstance(var, dict) and var.get("key") and var.get("dtype") in _LOCAL_EXTRACTORS:
+                keys_by_dtype.setdefault(var["dtype"], []).append(var["key"])
+        
+        extracted = {}
+        for dtype, keys in keys_by_dtype.items():
+            if len(keys) != 1:
+                continue
+            pattern = _LOCAL_EXTRACTORS[dtype]
+            if pattern.groups:
+                values = {match.group(1).replace(',', '') for match in pattern.finditer(user_query)}
             else:
-                logger.info("No variables could be prefilled from query")
-            
-            return validated_result
+                values = {match.group(0) for match in pattern.finditer(user_query)}
+            if dtype == "phone":
+                # Full international/area-coded numbers only - shorter digit runs are too ambiguous
+                values = {v for v in values if 10 <= sum(c.isdigit() for c in v) <= 15}
+            if len(values) == 1:
+                extracted[keys[0]] = values.pop()
+        return extracted
+    
+    def _get_prefill_variables_info(self, variables: List[Dict[str, Any]]) -> str:
+        """
+        Serialize the variable info sent with prefill prompts.
+        
+        Compact JSON (Gemini doesn't need pretty-printing), reused across
+        requests for the same variable schema.
+        
+        Args:
+            variables: List of variable definitions
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON from Gemini prefill response: {e}")
-            logger.debug(f"Response text: {result_text[:500] if 'result_text' in locals() else 'N/A'}...")
-            return {}
-        except Exception as e:
-            logger.error(f"Error in prefilling variables: {e}")
-            return {}
+        Returns:
+            JSON string of variable info with enum values and regex patterns
+        """
+        schema_key = _prefill_schema_key(variables)
+        if schema_key is not None:
+            with self._cache_lock:
+                variables_info = self._prefill_schema_cache.get(schema_key)
+            if variables_info is not None:
+                return variables_info
+        
+        variables_info = _json_dumps([{
+            "key": spec.key,
+            "label": spec.label,
+            "description": spec.description,
+            "dtype": spec.dtype,
+            "regex": spec.regex,
+            "enum_values": spec.enum_values,
+            "required": spec.required
+        } for spec in _to_var_specs(variables)])
+        if schema_key is not None:
+            with self._cache_lock:
+                self._prefill_schema_cache[schema_key] = variables_info
+        return variables_info
     
     def _validate_prefilled_values(
         self, 
@@ -572,15 +2247,32 @@ class GeminiService:
             return {}
         
         validated = {}
-        variable_map = {v.get("key"): v for v in variables if v.get("key")}
+        variable_map = {spec.key: spec for spec in _to_var_specs(variables)}
+        
+        # Resolve each variable's compiled regex and build its enum lookup once per call
+        compiled_regexes = {}
+        enum_lookups = {}
+        for key, spec in variable_map.items():
+            if spec.regex:
+                compiled = _compile_variable_regex(spec.regex)
+                if compiled is None:
+                    logger.warning(f"Invalid regex for {key}, skipping regex validation: {spec.regex}")
+                else:
+                    compiled_regexes[key] = compiled
+            if spec.enum_values:
+                enum_lookups[key] = {ev.lower(): ev for ev in spec.enum_values}
         
         for key, value in prefilled_values.items():
             if key not in variable_map:
                 logger.warning(f"Unknown variable key in prefill result: {key}")
                 continue
             
-            var_def = variable_map[key]
-            validated_value = self._validate_single_value(value, var_def)
+            validated_value = self._validate_single_value(
+                value,
+                variable_map[key],
+                compiled_regex=compiled_regexes.get(key),
+                enum_lookup=enum_lookups.get(key)
+            )
             
             if validated_value is not None:
                 validated[key] = validated_value
@@ -590,13 +2282,21 @@ class GeminiService:
         
         return validated
     
-    def _validate_single_value(self, value: Any, var_def: Dict[str, Any]) -> Any:
+    def _validate_single_value(
+        self,
+        value: Any,
+        spec: VarSpec,
+        compiled_regex: Optional["re.Pattern"] = None,
+        enum_lookup: Optional[Dict[str, str]] = None
+    ) -> Any:
         """
         Validate a single prefilled value against its variable definition
         
         Args:
             value: The extracted value
-            var_def: Variable definition with validation rules
+            spec: Variable definition with validation rules
+            compiled_regex: Precompiled spec.regex, looked up in the process-wide cache if not given
+            enum_lookup: Lowercased enum value -> original enum value, built here if not given
             
         Returns:
             Validated value or None if invalid
@@ -609,31 +2309,29 @@ class GeminiService:
         if not str_value:
             return None
         
-        # Check enum values
-        enum_values = var_def.get("enum_values")
+        # Check enum values (case-insensitive, returns original case)
+        enum_values = spec.enum_values
         if enum_values:
-            # Case-insensitive matching
-            for enum_val in enum_values:
-                if str_value.lower() == enum_val.lower():
-                    return enum_val  # Return original case
-            logger.debug(f"Value '{str_value}' not in enum values: {enum_values}")
-            return None
+            if enum_lookup is None:
+                enum_lookup = {ev.lower(): ev for ev in enum_values}
+            enum_val = enum_lookup.get(str_value.lower())
+            if enum_val is None:
+                logger.debug(f"Value '{str_value}' not in enum values: {enum_values}")
+            return enum_val
         
         # Check regex pattern
-        regex_pattern = var_def.get("regex")
-        if regex_pattern:
-            import re
-            if not re.match(regex_pattern, str_value):
-                logger.debug(f"Value '{str_value}' doesn't match regex: {regex_pattern}")
-                return None
+        if compiled_regex is None and spec.regex:
+            compiled_regex = _compile_variable_regex(spec.regex)
+        if compiled_regex is not None and not compiled_regex.match(str_value):
+            logger.debug(f"Value '{str_value}' doesn't match regex: {compiled_regex.pattern}")
+            return None
         
         # Type-specific validation
-        dtype = var_def.get("dtype", "string")
+        dtype = spec.dtype
         
         if dtype == "date":
             # Validate date format (YYYY-MM-DD)
-            import re
-            if not re.match(r'^\d{4}-\d{2}-\d{2}$', str_value):
+            if not _DATE_RE.match(str_value):
                 logger.debug(f"Invalid date format: {str_value}")
                 return None
         
@@ -648,13 +2346,13 @@ class GeminiService:
         
         elif dtype == "boolean":
             # Convert to boolean
-            if str_value.lower() in ['true', 'yes', 'enabled', '1']:
+            lowered = str_value.lower()
+            if lowered in _BOOL_TRUE:
                 return True
-            elif str_value.lower() in ['false', 'no', 'disabled', '0']:
+            elif lowered in _BOOL_FALSE:
                 return False
             else:
                 logger.debug(f"Invalid boolean value: {str_value}")
                 return None
         
         return str_value
-
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Path of the on-disk LLM response cache; empty disables it
+RESPONSE_CACHE_PATH = os.getenv("GEMINI_RESPONSE_CACHE_PATH", "")
+RESPONSE_CACHE_TTL = int(os.getenv("GEMINI_RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("GEMINI_RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+
+# Evict over-cap entries every this many writes rather than on each one
+_EVICT_EVERY = 64
+
+
+class ResponseCache:
+    """
+    Content-addressed, SQLite-backed LRU cache of LLM responses.
+    
+    Survives restarts and is shared by every process pointing at the same file,
+    so re-uploads of the same document family skip the API entirely.
+    """
+    
+    def __init__(self, path: str, ttl_seconds: int = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)")
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response.
+        
+        Args:
+            key: Content hash of the request
+        
+        Returns:
+            The cached response text, or None on a miss or expired entry
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                
+                value, created_at = row
+                if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None
+                
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                return value
+        except sqlite3.Error as e:
+            # The cache is best-effort; treat errors as a miss
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+    
+    def set(self, key: str, value: str) -> None:
+        """
+        Store a response, evicting least recently used entries above max_entries.
+        
+        Args:
+            key: Content hash of the request
+            value: Response text
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                self._writes += 1
+                if self._writes % _EVICT_EVERY == 0:
+                    self._conn.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the process-wide response cache, opening it on first use.
+    
+    Returns:
+        ResponseCache, or None if GEMINI_RESPONSE_CACHE_PATH is unset or the file can't be opened
+    """
+    global _response_cache
+    if not RESPONSE_CACHE_PATH:
+        return None
+    
+    with _response_cache_lock:
+        if _response_cache is None:
+            try:
+                _response_cache = ResponseCache(RESPONSE_CACHE_PATH)
+                logger.info(f"Opened LLM response cache at {RESPONSE_CACHE_PATH}")
+            except sqlite3.Error as e:
+                logger.error(f"Failed to open LLM response cache at {RESPONSE_CACHE_PATH}: {e}")
+                return None
+        return _response_cache
@@ -1,24 +1,195 @@
+from sqlalchemy import cast, text
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from app.services.gemini_service import GeminiService
-from app.services.embedding_service import EmbeddingService
+from pgvector.sqlalchemy import HALFVEC
+from app.db.base import EMBEDDING_HALFVEC_INDEX, EMBEDDING_INNER_PRODUCT
+from app.services.clients import get_gemini, get_embedder
 from typing import List, Dict, Any, Tuple, Optional
 from app.models.template import Template
 from app.models.template_variable import TemplateVariable
 from fastapi import HTTPException
 import uuid
+import hashlib
+import json
 import logging
+import os
+import re
+import time
 import yaml
 import asyncio
 import concurrent.futures
+from functools import lru_cache
+
+try:
+    from yaml import CSafeDumper as _YamlDumper  # libyaml C emitter
+except ImportError:
+    from yaml import SafeDumper as _YamlDumper
 
 logger = logging.getLogger(__name__)
 
+# Background embedding generation, overlapped with the Gemini ingest call
+_EMBEDDING_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv("EMBED_WORKERS", "4")), thread_name_prefix="embedding"
+)
+
+# HNSW candidate list size for similarity searches (pgvector's default is 40). An index
+# scan returns at most ef_search rows, so it's raised to top_k when that is larger.
+# Unset, it's picked from the template count at startup (configure_hnsw_ef_search).
+_PGVECTOR_DEFAULT_EF_SEARCH = 40
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "0")) or _PGVECTOR_DEFAULT_EF_SEARCH
+_HNSW_EF_SEARCH_PINNED = bool(os.getenv("HNSW_EF_SEARCH"))
+# ef_search by template count: (upper bound, ef_search)
+_HNSW_EF_SEARCH_BUCKETS = [(100_000, 40), (1_000_000, 100), (float("inf"), 200)]
+
+
+def _uuid7() -> uuid.UUID:
+    """
+    Time-ordered UUID (version 7, RFC 9562): 48-bit Unix milliseconds then random bits.
+    
+    New template_ids sort after existing ones, so inserts into the unique
+    template_id index append to its right edge instead of landing on random pages.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF000 << 64) | (0x7000 << 64)  # version 7
+    value = value & ~(0xC << 60) | (0x8 << 60)  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
+
+def configure_hnsw_ef_search(vector_count: int) -> int:
+    """
+    Pick hnsw.ef_search for the current number of stored embeddings, unless HNSW_EF_SEARCH is set.
+    
+    Larger graphs need a wider candidate list to keep recall; small ones don't.
+    
+    Args:
+        vector_count: Number of templates with an embedding
+        
+    Returns:
+        The ef_search now used by similarity searches
+    """
+    global HNSW_EF_SEARCH
+    if not _HNSW_EF_SEARCH_PINNED:
+        HNSW_EF_SEARCH = next(ef for upper_bound, ef in _HNSW_EF_SEARCH_BUCKETS if vector_count < upper_bound)
+    return HNSW_EF_SEARCH
+
+# {{variable_key}} placeholders in a template body
+_PLACEHOLDER_RE = re.compile(r'\{\{(\w+)\}\}')
+# Leading YAML frontmatter, up to and including the closing "---"
+_FRONTMATTER_RE = re.compile(r'\A---.*?---', re.DOTALL)
+
+
+def _split_into_chunks(text: str, max_chunk_size: int) -> List[str]:
+    """
+    Split text into chunks of at most max_chunk_size characters on paragraph boundaries.
+    
+    A single paragraph longer than max_chunk_size is hard-split.
+    """
+    if len(text) <= max_chunk_size:
+        return [text]
+    
+    chunks = []
+    current = []
+    current_size = 0
+    for paragraph in text.split("\n\n"):
+        if current and current_size + len(paragraph) + 2 > max_chunk_size:
+            chunks.append("\n\n".join(current))
+            current = []
+            current_size = 0
+        
+        while len(paragraph) > max_chunk_size:
+            chunks.append(paragraph[:max_chunk_size])
+            paragraph = paragraph[max_chunk_size:]
+        
+        current.append(paragraph)
+        current_size += len(paragraph) + 2
+    
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+class _AnswerMap(dict):
+    """Answers for str.format_map; unanswered placeholders are written back as {{key}}."""
+    
+    def __missing__(self, key: str) -> str:
+        return "{{" + key + "}}"
+
+@lru_cache(maxsize=512)
+def _parse_body(body_md: str) -> Tuple[str, Tuple[str, ...], Optional[str]]:
+    """
+    Renderable body of a template, its distinct placeholder keys in order of appearance,
+    and the body as a str.format_map template ({{key}} -> {key}, literal braces doubled).
+    
+    Memoized on the stored markdown, so repeated renders of the same template skip the
+    frontmatter strip and the placeholder scan. The format template is None when a key
+    is all digits, which format_map would read as a positional index.
+    """
+    match = _FRONTMATTER_RE.match(body_md)
+    if match:
+        body = body_md[match.end():].strip()
+    else:
+        # No (or malformed) frontmatter, use entire content
+        body = body_md
+        if body_md.startswith("---"):
+            logger.warning("Malformed YAML frontmatter, using entire content")
+    
+    # re.split with one group alternates literal text and placeholder keys
+    parts = _PLACEHOLDER_RE.split(body)
+    keys = parts[1::2]
+    format_body = None
+    if not any(key.isdigit() for key in keys):
+        format_body = "".join(
+            "{" + part + "}" if i % 2 else part.replace("{", "{{").replace("}", "}}")
+            for i, part in enumerate(parts)
+        )
+    return body, tuple(dict.fromkeys(keys)), format_body
+
+def _embedding_distance(embedding: List[float]):
+    """
+    (ORDER BY expression, cosine distance) from Template.embedding to a vector, as SQL expressions.
+    
+    With EMBEDDING_HALFVEC_INDEX both sides are cast to halfvec, matching the
+    expression of the halfvec HNSW index so pgvector can use it. With
+    EMBEDDING_INNER_PRODUCT the ordering is the negative inner product (<#>) served
+    by the ip index; embeddings are unit-normalized, so cosine distance is that plus 1.
+    """
+    column, vector = Template.embedding, embedding
+    if EMBEDDING_HALFVEC_INDEX:
+        halfvec = HALFVEC(Template.embedding.type.dim)
+        column, vector = cast(column, halfvec), cast(embedding, halfvec)
+    if EMBEDDING_INNER_PRODUCT:
+        negative_inner_product = column.max_inner_product(vector)
+        return negative_inner_product, negative_inner_product + 1.0
+    distance = column.cosine_distance(vector)
+    return distance, distance
+
+def _embedding_text(document_text: str) -> str:
+    """Text embedded for a template: the first 1000 chars of its source document."""
+    return document_text[:1000]
+
+def _set_hnsw_ef_search(db: Session, top_k: int) -> None:
+    """Set hnsw.ef_search for the current transaction when it differs from pgvector's default."""
+    ef_search = max(HNSW_EF_SEARCH, top_k)
+    if ef_search != _PGVECTOR_DEFAULT_EF_SEARCH:
+        db.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+
+def _dedupe_by_key(items: List[Any]) -> List[Dict[str, Any]]:
+    """Keep the first dict for each distinct "key", in order (drops non-dicts and keyless entries)."""
+    seen_keys = set()
+    unique = []
+    for item in items:
+        key = item.get("key") if isinstance(item, dict) else None
+        if key and key not in seen_keys:
+            seen_keys.add(key)
+            unique.append(item)
+    return unique
+
+
 class TemplateGenerator:
     def __init__(self):
         try:
-            self.gemini = GeminiService()
-            self.embedder = EmbeddingService()
+            self.gemini = get_gemini()
+            self.embedder = get_embedder()
+            self.max_chunk_size = int(os.getenv("MAX_CHUNK_SIZE", "10000"))
             logger.info("Template generator initialized with Gemini and Embedding services")
         except Exception as e:
             logger.error(f"Failed to initialize services: {e}")
@@ -58,31 +229,24 @@ class TemplateGenerator:
                 'file_description': file_description or 'Legal document template',
                 'jurisdiction': jurisdiction or 'IN',
                 'doc_type': doc_type or 'legal_document',
-                'variables': []
+                # Variables, with regex only when one is set
+                'variables': [
+                    {
+                        'key': var.get('key'),
+                        'label': var.get('label'),
+                        'description': var.get('description'),
+                        'example': var.get('example'),
+                        'required': var.get('required', False),
+                        'dtype': var.get('dtype', 'string'),
+                        **({'regex': var['regex']} if var.get('regex') else {})
+                    }
+                    for var in variables
+                ],
+                'similarity_tags': similarity_tags or []
             }
             
-            # Add variables
-            for var in variables:
-                var_dict = {
-                    'key': var.get('key'),
-                    'label': var.get('label'),
-                    'description': var.get('description'),
-                    'example': var.get('example'),
-                    'required': var.get('required', False),
-                    'dtype': var.get('dtype', 'string')
-                }
-                if var.get('regex'):
-                    var_dict['regex'] = var.get('regex')
-                frontmatter_dict['variables'].append(var_dict)
-            
-            # Add similarity tags
-            if similarity_tags:
-                frontmatter_dict['similarity_tags'] = similarity_tags
-            else:
-                frontmatter_dict['similarity_tags'] = []
-            
             # Convert to YAML string
-            yaml_str = yaml.dump(frontmatter_dict, default_flow_style=False, allow_unicode=True, sort_keys=False)
+            yaml_str = yaml.dump(frontmatter_dict, Dumper=_YamlDumper, default_flow_style=False, allow_unicode=True, sort_keys=False)
             
             # Wrap in delimiters
             frontmatter = f"---\n{yaml_str}---\n\n"
@@ -130,9 +294,28 @@ class TemplateGenerator:
             )
         
         try:
-            # Step 1: Classify document type to ensure it's legal or can be converted
-            logger.info("Classifying document type...")
-            classification = self.gemini.classify_document_type(document_raw_text)
+            # Exact re-upload: return the template already built from this text, skipping
+            # the Gemini calls, the embedding and the similarity search
+            source_sha256 = hashlib.sha256(document_raw_text.encode("utf-8")).hexdigest()
+            existing_template = db.query(Template).filter(
+                Template.source_sha256 == source_sha256
+            ).first()
+            if existing_template:
+                logger.info(f"Document already ingested as template {existing_template.template_id}, returning it")
+                return existing_template, self._load_existing_questions(existing_template, db)
+            
+            # The embedding only depends on the document text, so start it now and let it
+            # run behind the Gemini calls; it's awaited just before the duplicate check
+            logger.info("Starting parallel embedding generation")
+            embedding_future = self._generate_embedding_async(
+                document_text=document_raw_text,
+                file_name=file_name
+            )
+            
+            # Step 1: Classify, extract variables, build the body and questions in one call
+            logger.info(f"Starting full ingest for document: {file_name}")
+            ingest = self.gemini.full_ingest(document_raw_text)
+            classification = ingest.get("classification") or {}
             
             if not classification.get("is_legal_document", True):
                 # Document is not legal - convert to legal template
@@ -155,9 +338,10 @@ class TemplateGenerator:
                     jurisdiction=jurisdiction
                 )
                 
-                # Parse the generated legal template to extract variables
-                logger.info("Extracting variables from generated legal template...")
-                result = self.gemini.extract_variables_from_chunk(legal_template_text)
+                # Variables, body and questions for the generated template in one call
+                logger.info("Extracting variables and questions from generated legal template...")
+                chunks = _split_into_chunks(legal_template_text, self.max_chunk_size)
+                result = self.gemini.extract_variables_and_generate_template_combined_chunks(chunks)
                 
                 if not result:
                     raise HTTPException(
@@ -166,22 +350,26 @@ class TemplateGenerator:
                     )
                 
                 variables = result.get("variables", [])
+                questions = result.get("questions") or self.gemini.generate_questions_batch(variables)
                 similarity_tags = result.get("similarity_tags", [])
                 doc_type = suggested_template_type.lower().replace(" ", "_")
                 jurisdiction = jurisdiction
                 file_description = f"Generated legal template for {suggested_template_type}"
                 template_name = result.get("template_name", f"{suggested_template_type} Template")
                 
-                # Use the generated legal template as the body
-                template_body = legal_template_text
+                # Prefer the re-templated body, whose placeholders match the extracted variables
+                template_body = result.get("template_body") or legal_template_text
                 
             else:
-                # Document is already legal - proceed with OPTIMIZED processing
-                logger.info("Document classified as legal document, proceeding with optimized template generation")
+                # Document is already legal - variables, body and questions came with the ingest call
+                logger.info("Document classified as legal document, using full ingest result")
+                result = ingest
                 
-                # OPTIMIZED: Single API call for variables, template body, and questions
-                logger.info(f"Starting optimized combined processing for document: {file_name}")
-                result = self.gemini.extract_variables_and_generate_template_combined(document_raw_text)
+                if not result.get("template_body"):
+                    # Edge case: the single call skipped the body - fall back to the combined prompt
+                    logger.warning("Full ingest returned no template body, falling back to combined processing")
+                    chunks = _split_into_chunks(document_raw_text, self.max_chunk_size)
+                    result = self.gemini.extract_variables_and_generate_template_combined_chunks(chunks)
                 
                 if not result:
                     raise HTTPException(
@@ -206,8 +394,14 @@ class TemplateGenerator:
                         detail="Failed to generate template body"
                     )
             
+            # One variable per key - duplicates would become duplicate template_variable rows
+            unique_variables = _dedupe_by_key(variables)
+            if len(unique_variables) != len(variables):
+                logger.warning(f"Dropped {len(variables) - len(unique_variables)} duplicate or invalid variables")
+                variables = unique_variables
+            
             # Generate unique template_id
-            template_id = str(uuid.uuid4())
+            template_id = str(_uuid7())
             
             # Step 2: Use template name from initial extraction (already generated)
             if not template_name:
@@ -233,17 +427,6 @@ class TemplateGenerator:
             
             # Questions are already generated in the combined approach, no need to generate separately
             
-            # OPTIMIZED: Generate embedding in parallel with database operations
-            logger.info("Starting parallel embedding generation")
-            embedding_future = self._generate_embedding_async(
-                document_text=document_raw_text,
-                file_name=file_name, 
-                file_description=file_description, 
-                doc_type=doc_type, 
-                jurisdiction=jurisdiction, 
-                similarity_tags=similarity_tags
-            )
-            
             # Wait for embedding generation to complete first
             logger.info("Waiting for embedding generation to complete")
             embedding = embedding_future.result()
@@ -263,41 +446,8 @@ class TemplateGenerator:
                     # Return the existing similar template instead of creating a new one
                     logger.info(f"Returning existing template instead of creating duplicate")
                     
-                    # Get the questions for the existing template
-                    existing_questions = []
-                    try:
-                        variables = db.query(TemplateVariable).filter(
-                            TemplateVariable.template_id == existing_template.id
-                        ).order_by(TemplateVariable.id).all()
-                        
-                        for var in variables:
-                            question_data = None
-                            if var.question:
-                                import json
-                                try:
-                                    question_data = json.loads(var.question)
-                                except json.JSONDecodeError:
-                                    pass
-                            
-                            existing_questions.append({
-                                "key": var.key,
-                                "question": question_data.get("question", f"What is the {var.label}?") if question_data else f"What is the {var.label}?",
-                                "description": var.description,
-                                "example": var.example,
-                                "required": var.required,
-                                "dtype": var.dtype,
-                                "regex": var.regex,
-                                "enum_values": var.enum_values
-                            })
-                        
-                        logger.info(f"Retrieved {len(existing_questions)} questions for existing template")
-                        
-                    except Exception as e:
-                        logger.error(f"Error retrieving questions for existing template: {e}")
-                        existing_questions = []
-                    
                     logger.info(f"RETURNING EXISTING TEMPLATE: {existing_template.template_id}")
-                    return existing_template, existing_questions
+                    return existing_template, self._load_existing_questions(existing_template, db)
             
             # Save template to database (only after duplicate check passes)
             logger.info("Saving template to database")
@@ -309,31 +459,25 @@ class TemplateGenerator:
                 doc_type=doc_type,
                 jurisdiction=jurisdiction,
                 file_description=file_description,
-                embedding=embedding
+                embedding=embedding,
+                source_sha256=source_sha256
             )
             
+            # Template and variables go in one transaction: flush assigns template_record.id
+            # for the variable rows, and a single commit at the end saves both or neither
             db.add(template_record)
-            db.commit()
-            db.refresh(template_record)
-            logger.info(f"Template saved with embedding of dimension {len(embedding) if embedding else 0}")
+            db.flush()
+            logger.info(f"Template staged with embedding of dimension {len(embedding) if embedding else 0}")
             
             # Save template variables to database
             logger.info(f"Saving {len(variables)} template variables to database")
-            for var in variables:
-                # Find the corresponding question for this variable by key
-                var_question = None
-                for question in questions:
-                    if question.get('key') == var.get('key'):
-                        var_question = question
-                        break
-                
-                # Convert question to JSON string if it exists
-                question_json = None
-                if var_question:
-                    import json
-                    question_json = json.dumps(var_question)
-                
-                variable_record = TemplateVariable(
+            # Index questions by key once, serialized, instead of scanning the list per variable
+            question_json_by_key = {
+                question['key']: json.dumps(question) for question in _dedupe_by_key(questions)
+            }
+            # Added together so the flush sends one multi-row INSERT rather than one per variable
+            db.add_all([
+                TemplateVariable(
                     template_id=template_record.id,  # Foreign key to template.id (not template_id string)
                     key=var.get('key'),
                     label=var.get('label'),
@@ -343,9 +487,10 @@ class TemplateGenerator:
                     dtype=var.get('dtype', 'string'),
                     regex=var.get('regex'),
                     enum_values=var.get('enum_values'),
-                    question=question_json
+                    question=question_json_by_key.get(var.get('key'))
                 )
-                db.add(variable_record)
+                for var in variables
+            ])
             
             db.commit()
             logger.info(f"Successfully saved template and {len(variables)} variables to database")
@@ -371,6 +516,50 @@ class TemplateGenerator:
                 detail=f"Failed to generate template: {str(e)}"
             )
     
+    def _load_existing_questions(self, template: Template, db: Session) -> List[Dict[str, Any]]:
+        """
+        Rebuild the question list of a saved template from its variable rows.
+        
+        Args:
+            template: Existing template
+            db: Database session
+            
+        Returns:
+            Questions in variable order (empty if they can't be loaded)
+        """
+        existing_questions = []
+        try:
+            variables = db.query(TemplateVariable).filter(
+                TemplateVariable.template_id == template.id
+            ).order_by(TemplateVariable.id).all()
+            
+            for var in variables:
+                question_data = None
+                if var.question:
+                    try:
+                        question_data = json.loads(var.question)
+                    except json.JSONDecodeError:
+                        pass
+                
+                existing_questions.append({
+                    "key": var.key,
+                    "question": question_data.get("question", f"What is the {var.label}?") if question_data else f"What is the {var.label}?",
+                    "description": var.description,
+                    "example": var.example,
+                    "required": var.required,
+                    "dtype": var.dtype,
+                    "regex": var.regex,
+                    "enum_values": var.enum_values
+                })
+            
+            logger.info(f"Retrieved {len(existing_questions)} questions for existing template")
+            
+        except Exception as e:
+            logger.error(f"Error retrieving questions for existing template: {e}")
+            existing_questions = []
+        
+        return existing_questions
+    
     def find_matching_template(
         self, 
         user_query: str, 
@@ -509,35 +698,22 @@ class TemplateGenerator:
         try:
             logger.info(f"Rendering draft for template: {template.template_id}")
             
-            body_md = template.body_md
+            # Template body without YAML frontmatter, and the placeholders it contains
+            draft, placeholders, format_body = _parse_body(template.body_md)
             
-            # Extract only the template body (skip YAML frontmatter if present)
-            if body_md.startswith("---"):
-                # Split by the second occurrence of "---"
-                parts = body_md.split("---", 2)
-                if len(parts) >= 3:
-                    # parts[0] is empty, parts[1] is frontmatter, parts[2] is body
-                    draft = parts[2].strip()
-                    logger.info("Extracted template body from YAML frontmatter")
+            # Replace every {{variable_key}} with its answer in one pass; unanswered placeholders stay
+            if placeholders:
+                answers_str = _AnswerMap(
+                    (key, str(value) if value is not None else "") for key, value in answers.items()
+                )
+                if format_body is not None:
+                    draft = format_body.format_map(answers_str)
                 else:
-                    # Malformed frontmatter, use entire content
-                    draft = body_md
-                    logger.warning("Malformed YAML frontmatter, using entire content")
-            else:
-                # No frontmatter, use entire content
-                draft = body_md
-            
-            # Replace each placeholder with its corresponding answer
-            replaced_count = 0
-            for key, value in answers.items():
-                placeholder = f"{{{{{key}}}}}"  # {{variable_key}}
-                if placeholder in draft:
-                    # Convert value to string if it's not already
-                    value_str = str(value) if value is not None else ""
-                    draft = draft.replace(placeholder, value_str)
-                    replaced_count += 1
-            
-            logger.info(f"Successfully rendered draft with {replaced_count} replacements")
+                    draft = _PLACEHOLDER_RE.sub(
+                        lambda match: answers_str.get(match.group(1), match.group(0)), draft
+                    )
+            
+            logger.info(f"Successfully rendered draft ({len(placeholders)} distinct placeholders)")
             return draft
             
         except Exception as e:
@@ -569,27 +745,17 @@ class TemplateGenerator:
             answers = {}
         
         try:
-            import re
-            
-            body_md = template.body_md
-            
-            # Extract only the template body (skip YAML frontmatter if present)
-            if body_md.startswith("---"):
-                parts = body_md.split("---", 2)
-                if len(parts) >= 3:
-                    body_md = parts[2]
+            # Distinct {{variable_key}} placeholders in the template body (frontmatter skipped)
+            _, placeholders, _ = _parse_body(template.body_md)
             
-            # Find all placeholders in template {{variable_key}}
-            pattern = r'\{\{(\w+)\}\}'
-            placeholders = re.findall(pattern, body_md)
-            
-            # Find which placeholders are not in answers
-            missing = []
-            for placeholder in set(placeholders):  # Use set to avoid duplicates
-                if placeholder not in answers or answers[placeholder] is None or str(answers[placeholder]).strip() == "":
-                    missing.append(placeholder)
+            # Keys with a non-blank answer, checked once per answer rather than per placeholder
+            provided = {
+                key for key, value in answers.items()
+                if value is not None and (value.strip() if isinstance(value, str) else str(value).strip())
+            }
+            missing = [placeholder for placeholder in placeholders if placeholder not in provided]
             
-            logger.info(f"Found {len(missing)} missing variables out of {len(set(placeholders))} total")
+            logger.info(f"Found {len(missing)} missing variables out of {len(placeholders)} total")
             return missing
             
         except Exception as e:
@@ -627,38 +793,36 @@ class TemplateGenerator:
             raise ValueError("similarity_threshold must be between 0.0 and 1.0")
         
         try:
-            from sqlalchemy import text
-            
             logger.info(f"Checking for duplicate templates with similarity >= {similarity_threshold}")
             
             # Find the most similar template using cosine distance
             # cosine_distance = 1 - cosine_similarity
             # So similarity >= threshold means distance <= (1 - threshold)
             max_distance = 1.0 - similarity_threshold
+            _set_hnsw_ef_search(db, 1)
+            order, distance = _embedding_distance(embedding)
             
+            # ORDER BY the index's operator expression with LIMIT 1 so pgvector walks the
+            # HNSW index; the threshold is applied in SQL too. Only the primary key is
+            # selected, so body_md and embedding aren't read unless there's a hit.
             result = db.query(
-                Template,
-                Template.embedding.cosine_distance(embedding).label('distance')
+                Template.id,
+                distance.label('distance')
             ).filter(
-                Template.embedding.isnot(None)
+                Template.embedding.isnot(None),
+                distance <= max_distance
             ).order_by(
-                text('distance')
+                order
             ).first()
             
             if result:
-                template, distance = result
-                similarity = 1.0 - float(distance)
+                template = db.get(Template, result.id)
+                similarity = 1.0 - float(result.distance)
                 
-                logger.info(f"Most similar template: {template.template_id} with similarity {similarity:.3f}")
-                
-                if similarity >= similarity_threshold:
-                    logger.warning(f"Duplicate template detected! Similarity: {similarity:.3f} (threshold: {similarity_threshold})")
-                    return (template, similarity)
-                else:
-                    logger.info(f"Template is unique. Highest similarity: {similarity:.3f}")
-                    return None
+                logger.warning(f"Duplicate template detected! {template.template_id} similarity: {similarity:.3f} (threshold: {similarity_threshold})")
+                return (template, similarity)
             else:
-                logger.info("No existing templates found")
+                logger.info("Template is unique: no existing template within the similarity threshold")
                 return None
                 
         except Exception as e:
@@ -668,11 +832,36 @@ class TemplateGenerator:
                 detail=f"Failed to check for duplicate templates: {str(e)}"
             )
     
+    def embed_query(self, user_query: str) -> List[float]:
+        """
+        Embed a user query for similarity search.
+        
+        The query is normalized first so trivially different phrasings ("NDA  for Startup",
+        "nda for startup") hit the same embedding cache entry.
+        
+        Args:
+            user_query: User's natural language query
+            
+        Returns:
+            Query embedding vector
+            
+        Raises:
+            HTTPException: If the embedding can't be generated
+        """
+        try:
+            query_embedding = self.embedder.generate_embedding(self.embedder.normalize_query(user_query))
+            logger.info(f"Generated query embedding of dimension {len(query_embedding)}")
+            return query_embedding
+        except Exception as e:
+            logger.error(f"Failed to generate query embedding: {e}")
+            raise HTTPException(status_code=500, detail="Failed to process query")
+    
     def find_similar_templates(
         self,
         user_query: str,
         db: Session,
-        top_k: int = 5
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Tuple[Template, float]]:
         """
         Find templates using semantic similarity search.
@@ -681,6 +870,7 @@ class TemplateGenerator:
             user_query: User's natural language query
             db: Database session
             top_k: Number of top results to return
+            query_embedding: Precomputed embedding of user_query, generated here if not given
             
         Returns:
             List of (Template, similarity_score) tuples, sorted by similarity (highest first)
@@ -697,42 +887,39 @@ class TemplateGenerator:
         try:
             logger.info(f"Finding similar templates for query: {user_query[:100]}...")
             
-            # Generate embedding for user query
-            try:
-                query_embedding = self.embedder.generate_embedding(user_query)
-                logger.info(f"Generated query embedding of dimension {len(query_embedding)}")
-            except Exception as e:
-                logger.error(f"Failed to generate query embedding: {e}")
-                raise HTTPException(status_code=500, detail="Failed to process query")
+            if query_embedding is None:
+                query_embedding = self.embed_query(user_query)
             
             # Use pgvector for efficient similarity search
             try:
-                # Query using cosine distance (pgvector's <=> operator)
-                from sqlalchemy import text
+                # Query by cosine distance, ordered by the index's operator expression
+                # (see _embedding_distance) so the HNSW index serves the ORDER BY ... LIMIT
+                _set_hnsw_ef_search(db, top_k)
+                order, distance = _embedding_distance(query_embedding)
                 
+                # Cosine distance is 1 - cosine_similarity; the similarity is computed in the SELECT
                 results = db.query(
                     Template,
-                    Template.embedding.cosine_distance(query_embedding).label('distance')
+                    (1.0 - distance).label('similarity')
                 ).filter(
                     Template.embedding.isnot(None)
                 ).order_by(
-                    text('distance')
+                    order
                 ).limit(top_k).all()
                 
                 if not results:
                     logger.warning("No templates with embeddings found in database")
                     return []
                 
-                # Convert distance to similarity score (1 - distance for cosine)
-                # Cosine distance is 1 - cosine_similarity
                 similar_templates = [
-                    (template, 1.0 - float(distance))
-                    for template, distance in results
+                    (template, float(similarity))
+                    for template, similarity in results
                 ]
                 
                 logger.info(f"Found {len(similar_templates)} similar templates")
-                for i, (template, score) in enumerate(similar_templates[:3], 1):
-                    logger.debug(f"  {i}. {template.title} (similarity: {score:.3f})")
+                if logger.isEnabledFor(logging.DEBUG):
+                    for i, (template, score) in enumerate(similar_templates[:3], 1):
+                        logger.debug(f"  {i}. {template.title} (similarity: {score:.3f})")
                 
                 return similar_templates
                 
@@ -756,10 +943,10 @@ class TemplateGenerator:
         self,
         document_text: str,
         file_name: str,
-        file_description: Optional[str],
-        doc_type: Optional[str],
-        jurisdiction: Optional[str],
-        similarity_tags: List[str]
+        file_description: Optional[str] = None,
+        doc_type: Optional[str] = None,
+        jurisdiction: Optional[str] = None,
+        similarity_tags: Optional[List[str]] = None
     ) -> concurrent.futures.Future:
         """
         OPTIMIZED: Generate embedding asynchronously in parallel with other operations
@@ -770,7 +957,7 @@ class TemplateGenerator:
         def generate_embedding():
             try:
                 # Use document content for better duplicate detection
-                embedding_text = document_text[:1000]  # Use first 1000 chars for embedding
+                embedding_text = _embedding_text(document_text)
                 logger.info(f"Generating embedding for template from document content: {embedding_text[:100]}...")
                 
                 embedding = self.embedder.generate_embedding(embedding_text)
@@ -781,7 +968,6 @@ class TemplateGenerator:
                 logger.error(f"Error generating embedding: {e}")
                 return None
         
-        # Submit to thread pool for parallel execution
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(generate_embedding)
-            return future
\ No newline at end of file
+        # Submit to the shared pool and return at once; a per-call executor used as a
+        # context manager would wait for the embedding before returning
+        return _EMBEDDING_EXECUTOR.submit(generate_embedding)
\ No newline at end of file
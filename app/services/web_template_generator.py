@@ -5,8 +5,7 @@ import logging
 from typing import Dict, Any, Tuple, List
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from app.services.exa_service import ExaService
-from app.services.gemini_service import GeminiService
+from app.services.clients import get_exa, get_gemini
 from app.services.template_generator import TemplateGenerator
 from app.models.template import Template
 
@@ -20,8 +19,8 @@ class WebTemplateGenerator:
     """Service for creating templates from web sources when local templates aren't good enough."""
     
     def __init__(self):
-        self.exa_service = ExaService()
-        self.gemini_service = GeminiService()
+        self.exa_service = get_exa()
+        self.gemini_service = get_gemini()
         self.template_generator = TemplateGenerator()
         logger.info("WebTemplateGenerator initialized")
     
@@ -133,7 +132,7 @@ class WebTemplateGenerator:
             logger.info(f"Generating legal template from query: {user_query}")
             
             # Use Gemini to generate a legal template from the query
-            legal_template_text = self.gemini.generate_legal_template_from_business_need(
+            legal_template_text = self.gemini_service.generate_legal_template_from_business_need(
                 business_description=user_query,
                 suggested_template_type="Legal Document",  # Generic type
                 jurisdiction="US"  # Default jurisdiction
@@ -52,13 +52,21 @@ while [[ $# -gt 0 ]]; do
             TEST_TYPE="all"
             shift
             ;;
+        --parallel)
+            TEST_TYPE="parallel"
+            shift
+            ;;
+        --slow)
+            TEST_TYPE="slow"
+            shift
+            ;;
         -v|--verbose)
             VERBOSE="-vv"
             shift
             ;;
         *)
             echo "Unknown option: $1"
-            echo "Usage: $0 [--api|--performance|--all] [-v|--verbose]"
+            echo "Usage: $0 [--api|--performance|--all|--parallel|--slow] [-v|--verbose]"
             exit 1
             ;;
     esac
@@ -79,7 +87,16 @@ case $TEST_TYPE in
         ;;
     all)
         echo "Running all tests..."
-        pytest tests/ $VERBOSE
+        pytest tests/ -m "" $VERBOSE
+        ;;
+    slow)
+        echo "Running slow and integration tests only..."
+        pytest tests/ -m "slow or integration" $VERBOSE
+        ;;
+    parallel)
+        echo "Running stateless tests in parallel, then the rest serially..."
+        pytest tests/ -n auto -m parallel_safe $VERBOSE
+        pytest tests/ -m "not parallel_safe and not slow and not integration" $VERBOSE
         ;;
 esac
 
@@ -6,6 +6,7 @@ Tests use transactions that are rolled back, so no data is permanently modified.
 """
 import os
 import sys
+import warnings
 
 # CRITICAL: Load .env BEFORE any app imports
 from dotenv import load_dotenv
@@ -15,10 +16,15 @@ load_dotenv()
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Now safe to import app modules (env vars are loaded)
-from typing import Generator
+from typing import AsyncGenerator, Generator
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+import httpx
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, Session
 
 from app.main import app
@@ -27,6 +33,7 @@ from app.models.template import Template
 from app.models.document import Document
 from app.models.template_variable import TemplateVariable
 from app.models.instance import Instance
+from app.services.gemini_service import GeminiService
 
 
 # Use existing database from environment
@@ -51,8 +58,72 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-integration",
+        action="store_true",
+        default=False,
+        help="Call the real Gemini API instead of the mocked responses, and run the integration tests"
+    )
+
+
+# Marker expression pytest.ini's addopts applies when -m isn't given on the command line
+DEFAULT_MARKEXPR = "not slow and not integration"
+
+
+def pytest_configure(config):
+    # --run-integration opts back in to the integration tests the default -m deselects;
+    # an explicit -m on the command line still wins
+    if config.getoption("--run-integration") and config.option.markexpr == DEFAULT_MARKEXPR:
+        config.option.markexpr = "not slow"
+
+
+@pytest.fixture(autouse=True)
+def mock_gemini(request, monkeypatch) -> Generator[SimpleNamespace, None, None]:
+    """
+    Stub out Gemini network calls for every test, unless --run-integration is given.
+    
+    All sync and async completions go through GeminiService._generate_text and
+    _acall; both return "{}" (an empty JSON object) by default. Tests can set
+    mock_gemini.generate_text.return_value / mock_gemini.acall.return_value.
+    """
+    if request.config.getoption("--run-integration"):
+        yield SimpleNamespace(generate_text=None, acall=None)
+        return
+    
+    # Lets the shared GeminiService initialize without a real key
+    monkeypatch.setenv("GEMINI_API_KEY", os.getenv("GEMINI_API_KEY") or "test-key")
+    generate_text = MagicMock(return_value="{}")
+    acall = AsyncMock(return_value="{}")
+    monkeypatch.setattr(GeminiService, "_generate_text", generate_text)
+    monkeypatch.setattr(GeminiService, "_acall", acall)
+    yield SimpleNamespace(generate_text=generate_text, acall=acall)
+
+
+@pytest.fixture(scope="session")
+def prewarm_pool():
+    """
+    Open the pool's base connections up front so the first timed requests measure
+    query cost, not connection setup. Set PYTEST_PRE_WARM=0 to skip.
+    
+    Requested by the database fixtures only, so DB-free tests never connect.
+    """
+    if os.getenv("PYTEST_PRE_WARM", "1") == "1":
+        connections = []
+        try:
+            for _ in range(engine.pool.size()):
+                connections.append(engine.connect())
+        except OperationalError as e:
+            # Leave the error to the tests that actually use the database
+            warnings.warn(f"Skipping connection pool pre-warm, database unreachable: {e}")
+        finally:
+            for connection in connections:
+                connection.close()  # Returned to the pool, not torn down
+    yield
+
+
 @pytest.fixture(scope="function")
-def db() -> Generator[Session, None, None]:
+def db(prewarm_pool) -> Generator[Session, None, None]:
     """
     Create a database session with robust transaction handling.
     Changes persist in the test database (no rollback).
@@ -81,8 +152,17 @@ def db() -> Generator[Session, None, None]:
             pass
 
 
+@pytest.fixture(scope="session")
+def app_client(prewarm_pool) -> Generator[TestClient, None, None]:
+    """
+    One TestClient for the whole run, so app startup (lifespan, init_db) happens once.
+    """
+    with TestClient(app) as test_client:
+        yield test_client
+
+
 @pytest.fixture(scope="function")
-def client(db: Session) -> Generator[TestClient, None, None]:
+def client(app_client: TestClient, db: Session) -> Generator[TestClient, None, None]:
     """
     Create a test client with a test database session.
     """
@@ -94,24 +174,47 @@ def client(db: Session) -> Generator[TestClient, None, None]:
     
     app.dependency_overrides[get_db] = override_get_db
     
-    with TestClient(app) as test_client:
-        yield test_client
+    yield app_client
     
     app.dependency_overrides.clear()
 
 
-@pytest.fixture
-def sample_template(db: Session) -> Template:
+@pytest_asyncio.fixture
+async def aclient(app_client: TestClient) -> AsyncGenerator[httpx.AsyncClient, None]:
     """
-    Create a sample template for testing.
-    Deletes existing template with same ID if it exists.
+    Async client calling the app in-process, for tests that send requests concurrently.
+    
+    No get_db override: concurrent requests can't share one Session, so each request
+    opens its own from the app (same DATABASE_URL). Depends on app_client so startup has run.
     """
-    # Delete existing template if it exists
-    test_template_id = "tpl_test_12345678-1234-1234-1234-123456789012"
-    existing = db.query(Template).filter(Template.template_id == test_template_id).first()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+        yield async_client
+
+
+SAMPLE_TEMPLATE_ID = "tpl_test_12345678-1234-1234-1234-123456789012"
+
+
+def _delete_sample_template(db: Session):
+    """Delete the sample template (and, by cascade, its variables) if it exists."""
+    existing = db.query(Template).filter(Template.template_id == SAMPLE_TEMPLATE_ID).first()
     if existing:
         db.delete(existing)
         db.commit()
+
+
+@pytest.fixture(scope="session")
+def sample_template(prewarm_pool) -> Generator[Template, None, None]:
+    """
+    Create a sample template shared by the whole run.
+    Deletes existing template with same ID if it exists, and again at the end.
+    
+    Tests must not modify or delete it; the returned object is detached, with
+    its columns loaded.
+    """
+    db = TestingSessionLocal()
+    _delete_sample_template(db)
+    test_template_id = SAMPLE_TEMPLATE_ID
     
     template = Template(
         template_id=test_template_id,
@@ -208,12 +311,17 @@ This Agreement shall be governed by the laws of India.
         )
     ]
     
-    for var in variables:
-        db.add(var)
-    
+    # One flush inserts all rows in a single batched INSERT
+    db.add_all(variables)
     db.commit()
+    db.refresh(template)
+    db.expunge(template)
     
-    return template
+    try:
+        yield template
+    finally:
+        _delete_sample_template(db)
+        db.close()
 
 
 @pytest.fixture
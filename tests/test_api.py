@@ -27,6 +27,8 @@ The following tests make REAL API calls to external services:
    - May fail without: GEMINI_API_KEY in environment
    - Will consume: API credits/quota
 
+Gemini is mocked (see conftest.mock_gemini) unless pytest runs with --run-integration.
+
 Tests that DON'T call external APIs:
 - All error/validation tests (invalid file types, missing params, etc.)
 - Template CRUD operations (list, get, delete)
@@ -35,10 +37,11 @@ Tests that DON'T call external APIs:
 
 NOTE: Tests persist data to your test database (no rollback).
 """
+import io
 import time
 import json
-import io
 from typing import Dict, Any
+import docx
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
@@ -46,28 +49,96 @@ from sqlalchemy.orm import Session
 from app.models.template import Template
 
 
+# Upload payloads, shared by every test that sends them; httpx reads bytes
+# content directly, so no per-test BytesIO is needed
+PDF_BYTES = b"%PDF-1.4\n1 0 obj\n<<\n/Type /Catalog\n>>\nendobj\n%%EOF"  # Minimal mock PDF
+DOCX_BYTES = b"PK\x03\x04"  # DOCX signature
+TXT_BYTES = b"This is a text file"
+JPG_BYTES = b"\xff\xd8\xff\xe0"  # JPG signature
+
+
+def _docx_bytes(*paragraphs: str) -> bytes:
+    """Build a real DOCX document holding the given paragraphs."""
+    document = docx.Document()
+    for text in paragraphs:
+        document.add_paragraph(text)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+NDA_DOCX_BYTES = _docx_bytes(
+    "MUTUAL NON-DISCLOSURE AGREEMENT",
+    "This Agreement is entered into on 2024-03-01 between Acme Corp and Globex Inc.",
+    "Each party shall keep the other party's Confidential Information secret for 3 years."
+)
+UPLOAD_TEMPLATE_NAME = "Upload Test Mutual NDA Template"
+
+# What the single full-ingest Gemini call returns for NDA_DOCX_BYTES
+FULL_INGEST_RESPONSE = json.dumps({
+    "classification": {
+        "is_legal_document": True,
+        "document_type": "non_disclosure_agreement",
+        "suggested_legal_template": None,
+        "reasoning": "Formal agreement between parties with confidentiality obligations",
+        "legal_jurisdiction": "US",
+        "conversion_notes": ""
+    },
+    "variables": [
+        {"key": "effective_date", "label": "Effective Date", "description": "Date the agreement starts",
+         "example": "2024-01-15", "required": True, "dtype": "date", "regex": "^\\d{4}-\\d{2}-\\d{2}$"},
+        {"key": "first_party_name", "label": "First Party Name", "description": "Name of the first party",
+         "example": "ABC Corporation", "required": True, "dtype": "string", "regex": ""},
+        {"key": "second_party_name", "label": "Second Party Name", "description": "Name of the second party",
+         "example": "XYZ Ltd", "required": True, "dtype": "string", "regex": ""},
+        {"key": "confidentiality_years", "label": "Confidentiality Period", "description": "Years information stays confidential",
+         "example": "2", "required": True, "dtype": "int", "regex": "^\\d+$"}
+    ],
+    "template_body": (
+        "# Mutual Non-Disclosure Agreement\n\n"
+        "This Agreement is entered into on {{effective_date}} between {{first_party_name}} and {{second_party_name}}.\n\n"
+        "Each party shall keep the other party's Confidential Information secret for {{confidentiality_years}} years."
+    ),
+    "questions": [
+        {"key": "effective_date", "question": "When does the agreement take effect?", "description": "Date the agreement starts",
+         "example": "2024-01-15", "required": True, "dtype": "date", "regex": "^\\d{4}-\\d{2}-\\d{2}$"},
+        {"key": "first_party_name", "question": "What is the name of the first party?", "description": "Name of the first party",
+         "example": "ABC Corporation", "required": True, "dtype": "string", "regex": ""},
+        {"key": "second_party_name", "question": "What is the name of the second party?", "description": "Name of the second party",
+         "example": "XYZ Ltd", "required": True, "dtype": "string", "regex": ""},
+        {"key": "confidentiality_years", "question": "For how many years must information stay confidential?",
+         "description": "Years information stays confidential", "example": "2", "required": True, "dtype": "int", "regex": "^\\d+$"}
+    ],
+    "similarity_tags": ["nda", "confidentiality", "mutual"],
+    "doc_type": "nda",
+    "jurisdiction": "US",
+    "file_description": "Mutual confidentiality agreement between two parties",
+    "template_name": UPLOAD_TEMPLATE_NAME
+})
+
+
 class PerformanceTimer:
     """Context manager to measure execution time."""
     
     def __init__(self, test_name: str):
         self.test_name = test_name
-        self.start_time = None
-        self.end_time = None
-        self.duration = None
+        self.start_ns = None
+        self.duration_ns = None
     
     def __enter__(self):
-        self.start_time = time.time()
+        # Monotonic, nanosecond resolution - sub-ms endpoints don't round to 0ms
+        self.start_ns = time.perf_counter_ns()
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.end_time = time.time()
-        self.duration = self.end_time - self.start_time
-        print(f"\n⏱️  {self.test_name}: {self.duration:.3f}s ({self.duration*1000:.0f}ms)")
+        self.duration_ns = time.perf_counter_ns() - self.start_ns
+        print(f"\n⏱️  {self.test_name}: {self.duration_ns / 1e9:.3f}s ({self.duration_ns / 1e6:.2f}ms)")
 
 
 class TestHealthCheck:
     """Tests for health check endpoint."""
     
+    @pytest.mark.parallel_safe
     def test_root_health_check(self, client: TestClient):
         """Test the root health check endpoint."""
         with PerformanceTimer("GET / - Health Check"):
@@ -87,9 +158,7 @@ class TestUploadAPI:
     
     def test_upload_pdf_success(self, client: TestClient, db: Session):
         """Test successful PDF upload."""
-        # Create a mock PDF file
-        pdf_content = b"%PDF-1.4\n1 0 obj\n<<\n/Type /Catalog\n>>\nendobj\n%%EOF"
-        files = {"file": ("test.pdf", io.BytesIO(pdf_content), "application/pdf")}
+        files = {"file": ("test.pdf", PDF_BYTES, "application/pdf")}
         
         with PerformanceTimer("POST /api/v1/upload - Success (PDF)"):
             response = client.post("/api/v1/upload", files=files)
@@ -98,18 +167,43 @@ class TestUploadAPI:
         # In real test, you'd mock the services or use actual test PDFs
         assert response.status_code in [200, 500]  # May fail due to PDF parsing
     
-    def test_upload_docx_success(self, client: TestClient, db: Session):
-        """Test successful DOCX upload."""
-        # Create a mock DOCX file
-        docx_content = b"PK\x03\x04"  # DOCX signature
-        files = {"file": ("test.docx", io.BytesIO(docx_content), "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+    def test_upload_docx_success(self, client: TestClient, db: Session, mock_gemini):
+        """Test successful DOCX upload, end to end through template creation."""
+        if mock_gemini.generate_text is not None:
+            mock_gemini.generate_text.return_value = FULL_INGEST_RESPONSE
+        files = {"file": ("test_nda.docx", NDA_DOCX_BYTES, "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+        
+        try:
+            with PerformanceTimer("POST /api/v1/upload - Success (DOCX)"):
+                response = client.post("/api/v1/upload", files=files)
+            
+            assert response.status_code == 200
+            data = response.json()
+            assert data["error"] is False
+            assert data["body"]["document_name"] == "test_nda.docx"
+            assert "{{" in data["body"]["template"]["body_md"]
+            assert len(data["body"]["questions"]) > 0
+            
+            if mock_gemini.generate_text is not None:
+                assert data["body"]["template"]["title"] == UPLOAD_TEMPLATE_NAME
+                assert {q["key"] for q in data["body"]["questions"]} == {
+                    "effective_date", "first_party_name", "second_party_name", "confidentiality_years"
+                }
+        finally:
+            db.rollback()
+            db.query(Template).filter(Template.title == UPLOAD_TEMPLATE_NAME).delete(synchronize_session=False)
+            db.commit()
+    
+    def test_upload_corrupt_docx(self, client: TestClient):
+        """A file with a DOCX signature but no document inside fails extraction."""
+        files = {"file": ("test.docx", DOCX_BYTES, "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
         
-        with PerformanceTimer("POST /api/v1/upload - Success (DOCX)"):
+        with PerformanceTimer("POST /api/v1/upload - Corrupt DOCX"):
             response = client.post("/api/v1/upload", files=files)
         
-        # Note: This will fail without actual DOCX processing
-        assert response.status_code in [200, 500]  # May fail due to DOCX parsing
+        assert response.status_code == 500
     
+    @pytest.mark.parallel_safe
     def test_upload_no_file(self, client: TestClient):
         """Test upload with no file provided."""
         with PerformanceTimer("POST /api/v1/upload - No File Error"):
@@ -117,10 +211,10 @@ class TestUploadAPI:
         
         assert response.status_code == 422  # FastAPI validation error
     
+    @pytest.mark.parallel_safe
     def test_upload_invalid_file_type_txt(self, client: TestClient):
         """Test upload with invalid file type (TXT)."""
-        txt_content = b"This is a text file"
-        files = {"file": ("test.txt", io.BytesIO(txt_content), "text/plain")}
+        files = {"file": ("test.txt", TXT_BYTES, "text/plain")}
         
         with PerformanceTimer("POST /api/v1/upload - Invalid Type (TXT)"):
             response = client.post("/api/v1/upload", files=files)
@@ -130,10 +224,10 @@ class TestUploadAPI:
         assert data["error"] is True
         assert "PDF and DOCX" in data["message"]
     
+    @pytest.mark.parallel_safe
     def test_upload_invalid_file_type_jpg(self, client: TestClient):
         """Test upload with invalid file type (JPG)."""
-        jpg_content = b"\xff\xd8\xff\xe0"  # JPG signature
-        files = {"file": ("test.jpg", io.BytesIO(jpg_content), "image/jpeg")}
+        files = {"file": ("test.jpg", JPG_BYTES, "image/jpeg")}
         
         with PerformanceTimer("POST /api/v1/upload - Invalid Type (JPG)"):
             response = client.post("/api/v1/upload", files=files)
@@ -143,10 +237,10 @@ class TestUploadAPI:
         assert data["error"] is True
         assert "PDF and DOCX" in data["message"]
     
+    @pytest.mark.parallel_safe
     def test_upload_file_without_extension(self, client: TestClient):
         """Test upload with file without extension."""
-        content = b"Some content"
-        files = {"file": ("document", io.BytesIO(content), "application/octet-stream")}
+        files = {"file": ("document", b"Some content", "application/octet-stream")}
         
         with PerformanceTimer("POST /api/v1/upload - No Extension"):
             response = client.post("/api/v1/upload", files=files)
@@ -173,6 +267,7 @@ class TestTemplateAPI:
         assert "pagination" in data["body"]
         assert len(data["body"]["templates"]) >= 1
     
+    @pytest.mark.parallel_safe
     def test_list_templates_invalid_skip(self, client: TestClient):
         """Test listing templates with invalid skip parameter."""
         with PerformanceTimer("GET /api/v1/template - Invalid Skip"):
@@ -183,6 +278,7 @@ class TestTemplateAPI:
         assert data["error"] is True
         assert "skip parameter must be >= 0" in data["message"]
     
+    @pytest.mark.parallel_safe
     def test_list_templates_invalid_limit_high(self, client: TestClient):
         """Test listing templates with limit too high."""
         with PerformanceTimer("GET /api/v1/template - Limit Too High"):
@@ -193,6 +289,7 @@ class TestTemplateAPI:
         assert data["error"] is True
         assert "between 1 and 1000" in data["message"]
     
+    @pytest.mark.parallel_safe
     def test_list_templates_invalid_limit_low(self, client: TestClient):
         """Test listing templates with limit too low."""
         with PerformanceTimer("GET /api/v1/template - Limit Too Low"):
@@ -228,9 +325,21 @@ class TestTemplateAPI:
         assert data["error"] is True
         assert "not found" in data["message"].lower()
     
-    def test_delete_template_success(self, client: TestClient, sample_template: Template):
+    def test_delete_template_success(self, client: TestClient, db: Session):
         """Test deleting a template."""
-        template_id = sample_template.template_id
+        # Its own row - the shared sample_template must survive the run
+        template_id = "tpl_test_delete_12345678-1234-1234-1234-123456789012"
+        existing = db.query(Template).filter(Template.template_id == template_id).first()
+        if existing:
+            db.delete(existing)
+            db.flush()
+        db.add(Template(
+            template_id=template_id,
+            title="Disposable Template",
+            body_md="# Disposable Template\n\nDeleted by the test.",
+            embedding=[0.1] * 384
+        ))
+        db.commit()
         
         with PerformanceTimer("DELETE /api/v1/template/{id} - Success"):
             response = client.delete(f"/api/v1/template/{template_id}")
@@ -264,12 +373,12 @@ class TestDraftAPI:
         with PerformanceTimer("POST /api/v1/draft/questions - Success"):
             response = client.post("/api/v1/draft/questions", json=payload)
         
-        assert response.status_code in [200, 500]  # May fail without Gemini API
-        if response.status_code == 200:
-            data = response.json()
-            assert data["error"] is False
-            assert "body" in data
-            assert "questions" in data["body"]
+        # Prefill errors are caught by the endpoint, so this holds with or without Gemini
+        assert response.status_code == 200
+        data = response.json()
+        assert data["error"] is False
+        assert "body" in data
+        assert "questions" in data["body"]
     
     def test_generate_questions_template_not_found(self, client: TestClient):
         """Test generating questions for non-existent template."""
@@ -286,6 +395,7 @@ class TestDraftAPI:
         assert data["error"] is True
         assert "not found" in data["message"].lower()
     
+    @pytest.mark.parallel_safe
     def test_generate_questions_missing_template_id(self, client: TestClient):
         """Test generating questions without template_id."""
         payload = {"user_query": "Test query"}
@@ -355,6 +465,7 @@ class TestDraftAPI:
         assert data["error"] is True
         assert "not found" in data["message"].lower()
     
+    @pytest.mark.parallel_safe
     def test_generate_draft_missing_template_id(self, client: TestClient):
         """Test generating draft without template_id."""
         payload = {
@@ -369,6 +480,7 @@ class TestDraftAPI:
 
 
 
+@pytest.mark.integration
 class TestEndToEndScenarios:
     """End-to-end integration tests."""
     
@@ -3,11 +3,13 @@ Performance benchmarking tests for LegalPlates API.
 
 These tests specifically focus on measuring and reporting performance metrics.
 """
+import asyncio
+import math
 import time
 import statistics
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+import httpx
 import pytest
-from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
 from app.models.template import Template
@@ -16,14 +18,20 @@ from app.models.template import Template
 class PerformanceBenchmark:
     """Class to collect and report performance metrics."""
     
-    results: Dict[str, List[float]] = {}
+    # Running stats per test, in nanoseconds (time.perf_counter_ns):
+    # (count, min, max, mean, M2) updated with Welford's algorithm, so memory
+    # stays constant however many samples are recorded
+    results: Dict[str, Tuple[int, int, int, float, float]] = {}
     
     @classmethod
-    def record(cls, test_name: str, duration: float):
-        """Record a test duration."""
-        if test_name not in cls.results:
-            cls.results[test_name] = []
-        cls.results[test_name].append(duration)
+    def record(cls, test_name: str, duration_ns: int):
+        """Record a test duration in nanoseconds."""
+        count, min_ns, max_ns, mean, m2 = cls.results.get(test_name, (0, duration_ns, duration_ns, 0.0, 0.0))
+        count += 1
+        delta = duration_ns - mean
+        mean += delta / count
+        m2 += delta * (duration_ns - mean)
+        cls.results[test_name] = (count, min(min_ns, duration_ns), max(max_ns, duration_ns), mean, m2)
     
     @classmethod
     def report(cls):
@@ -31,16 +39,17 @@ class PerformanceBenchmark:
         if not cls.results:
             return
         
-        print("\n" + "="*80)
+        print("\n" + "="*92)
         print("PERFORMANCE BENCHMARK REPORT")
-        print("="*80)
-        print(f"{'Endpoint':<50} {'Avg (ms)':<12} {'Min (ms)':<12} {'Max (ms)':<12}")
-        print("-"*80)
-        
-        for test_name, durations in sorted(cls.results.items()):
-            avg_ms = statistics.mean(durations) * 1000
-            min_ms = min(durations) * 1000
-            max_ms = max(durations) * 1000
+        print("="*92)
+        print(f"{'Endpoint':<50} {'Avg (ms)':<12} {'Min (ms)':<12} {'Max (ms)':<12} {'Std (ms)':<12}")
+        print("-"*92)
+        
+        for test_name, (count, min_ns, max_ns, mean, m2) in sorted(cls.results.items()):
+            avg_ms = mean / 1e6
+            min_ms = min_ns / 1e6
+            max_ms = max_ns / 1e6
+            std_ms = math.sqrt(m2 / (count - 1)) / 1e6 if count > 1 else 0.0
             
             # Color code: green if <100ms, yellow if <500ms, red if >=500ms
             if avg_ms < 100:
@@ -50,61 +59,69 @@ class PerformanceBenchmark:
             else:
                 color = "🔴"
             
-            print(f"{color} {test_name:<47} {avg_ms:>10.0f} {min_ms:>10.0f} {max_ms:>10.0f}")
+            print(f"{color} {test_name:<47} {avg_ms:>10.2f} {min_ms:>10.2f} {max_ms:>10.2f} {std_ms:>10.2f}")
         
-        print("="*80)
+        print("="*92)
         print("\nLegend:")
         print("🟢 Fast (<100ms)  🟡 Acceptable (<500ms)  🔴 Slow (>=500ms)")
-        print("="*80)
+        print("="*92)
+
+
+async def timed_request(request) -> Tuple[Any, int]:
+    """Await a client request; returns (response, duration in ns)."""
+    start = time.perf_counter_ns()
+    response = await request
+    return response, time.perf_counter_ns() - start
 
 
-def measure_performance(test_name: str, func, *args, **kwargs):
-    """Measure and record performance of a function call."""
-    start = time.time()
-    result = func(*args, **kwargs)
-    duration = time.time() - start
-    PerformanceBenchmark.record(test_name, duration)
-    return result, duration
+async def ameasure_performance(test_name: str, request) -> Tuple[Any, int]:
+    """Measure and record an awaited client request; returns (response, duration in ns)."""
+    response, duration_ns = await timed_request(request)
+    PerformanceBenchmark.record(test_name, duration_ns)
+    return response, duration_ns
 
 
 class TestPerformance:
-    """Performance tests for all endpoints."""
+    """
+    Performance tests for all endpoints.
+    
+    Driven through the async in-process client (ASGITransport), which calls the app
+    on the test's own event loop, so the timings carry no TestClient thread hop.
+    Each test runs its ITERATIONS back to back, so setup is paid once per endpoint.
+    """
+    
+    ITERATIONS = 3
     
-    @pytest.mark.parametrize("iteration", range(3))
-    def test_health_check_performance(self, client: TestClient, iteration: int):
+    async def _benchmark(self, test_name: str, send) -> None:
+        """Time ITERATIONS sequential requests made by send(); each must return 200."""
+        for iteration in range(self.ITERATIONS):
+            response, duration_ns = await ameasure_performance(test_name, send())
+            assert response.status_code == 200
+            print(f"  Iteration {iteration + 1}: {duration_ns / 1e6:.2f}ms")
+    
+    @pytest.mark.asyncio
+    async def test_health_check_performance(self, aclient: httpx.AsyncClient):
         """Benchmark health check endpoint (3 iterations)."""
-        response, duration = measure_performance(
-            "GET / (Health Check)",
-            client.get,
-            "/"
-        )
-        assert response.status_code == 200
-        print(f"  Iteration {iteration + 1}: {duration*1000:.0f}ms")
+        await self._benchmark("GET / (Health Check)", lambda: aclient.get("/"))
     
-    @pytest.mark.parametrize("iteration", range(3))
-    def test_list_templates_performance(self, client: TestClient, sample_template: Template, iteration: int):
+    @pytest.mark.asyncio
+    async def test_list_templates_performance(self, aclient: httpx.AsyncClient, sample_template: Template):
         """Benchmark list templates endpoint (3 iterations)."""
-        response, duration = measure_performance(
+        await self._benchmark(
             "GET /api/v1/template (List)",
-            client.get,
-            "/api/v1/template?skip=0&limit=10"
+            lambda: aclient.get("/api/v1/template?skip=0&limit=10")
         )
-        assert response.status_code == 200
-        print(f"  Iteration {iteration + 1}: {duration*1000:.0f}ms")
     
-    @pytest.mark.parametrize("iteration", range(3))
-    def test_get_template_performance(self, client: TestClient, sample_template: Template, iteration: int):
+    @pytest.mark.asyncio
+    async def test_get_template_performance(self, aclient: httpx.AsyncClient, sample_template: Template):
         """Benchmark get template by ID endpoint (3 iterations)."""
-        response, duration = measure_performance(
+        await self._benchmark(
             "GET /api/v1/template/{id}",
-            client.get,
-            f"/api/v1/template/{sample_template.template_id}"
+            lambda: aclient.get(f"/api/v1/template/{sample_template.template_id}")
         )
-        assert response.status_code == 200
-        print(f"  Iteration {iteration + 1}: {duration*1000:.0f}ms")
     
-    @pytest.mark.parametrize("iteration", range(3))
-    def test_generate_draft_performance(self, client: TestClient, sample_template: Template, iteration: int):
+    @pytest.mark.asyncio
+    async def test_generate_draft_performance(self, aclient: httpx.AsyncClient, sample_template: Template):
         """Benchmark draft generation endpoint (3 iterations)."""
         payload = {
             "template_id": sample_template.template_id,
@@ -116,47 +133,95 @@ class TestPerformance:
             "user_query": "Create a service agreement"
         }
         
-        response, duration = measure_performance(
-            "POST /api/v1/draft/generate",
-            client.post,
-            "/api/v1/draft/generate",
-            json=payload
+        await self._benchmark(
+            "HTTP: POST /api/v1/draft/generate",
+            lambda: aclient.post("/api/v1/draft/generate", json=payload)
         )
-        assert response.status_code == 200
-        print(f"  Iteration {iteration + 1}: {duration*1000:.0f}ms")
+    
+    @pytest.mark.parametrize("size", [4096, 65536, 1_048_576])
+    @pytest.mark.asyncio
+    async def test_upload_size_scaling(self, aclient: httpx.AsyncClient, size: int):
+        """Benchmark upload request handling as the body grows (4 KB, 64 KB, 1 MB)."""
+        # Not a parseable PDF - this times receiving and reading the upload, so a
+        # parse failure (500) is expected and fine
+        pdf_bytes = b"%PDF-1.4\n" + b"\0" * size
+        
+        for iteration in range(self.ITERATIONS):
+            response, duration_ns = await ameasure_performance(
+                f"POST /api/v1/upload ({size // 1024} KB)",
+                aclient.post("/api/v1/upload", files={"file": ("scaling.pdf", pdf_bytes, "application/pdf")})
+            )
+            assert response.status_code in [200, 500]
+            print(f"  {size // 1024} KB iteration {iteration + 1}: {duration_ns / 1e6:.2f}ms")
+    
+    def test_render_draft_performance(self, sample_template: Template):
+        """Benchmark the placeholder substitution behind draft generation, without HTTP or the DB."""
+        from app.services.template_generator import TemplateGenerator
+        
+        template_service = TemplateGenerator()
+        answers = {
+            "company_name": "Acme Corp",
+            "client_name": "Tech Solutions Inc",
+            "contract_date": "2025-01-15"
+        }
+        
+        # Enough calls per sample to rise well above timer resolution
+        calls = 1000
+        for iteration in range(self.ITERATIONS):
+            start = time.perf_counter_ns()
+            for _ in range(calls):
+                draft_md = template_service.render_draft(sample_template, answers)
+            duration_ns = (time.perf_counter_ns() - start) // calls
+            PerformanceBenchmark.record("DIRECT: TemplateGenerator.render_draft", duration_ns)
+            print(f"  Iteration {iteration + 1}: {duration_ns / 1e3:.2f}µs per render")
+        
+        assert "Acme Corp" in draft_md
+        assert "{{company_name}}" not in draft_md
 
 
+@pytest.mark.slow
 class TestLoadTesting:
-    """Basic load testing - multiple concurrent-like requests."""
+    """Basic load testing - concurrent requests against the in-process app."""
+    
+    @staticmethod
+    def _report(durations: List[int], wall_ns: int):
+        avg = statistics.mean(durations) / 1e6
+        min_d = min(durations) / 1e6
+        max_d = max(durations) / 1e6
+        p50 = statistics.median(durations) / 1e6
+        p95 = statistics.quantiles(durations, n=20, method="inclusive")[18] / 1e6
+        # ~1x means the requests ran one after another; up to N x means they overlapped
+        overlap = sum(durations) / wall_ns
+        
+        print("-"*60)
+        print(f"Average: {avg:.2f}ms | Min: {min_d:.2f}ms | Max: {max_d:.2f}ms")
+        print(f"p50: {p50:.2f}ms | p95: {p95:.2f}ms | Wall: {wall_ns / 1e6:.2f}ms | Overlap: {overlap:.1f}x")
+        print("="*60)
     
-    def test_load_list_templates(self, client: TestClient, sample_template: Template):
-        """Test list templates under load (10 sequential requests)."""
+    @pytest.mark.asyncio
+    async def test_load_list_templates(self, aclient: httpx.AsyncClient, sample_template: Template):
+        """Test list templates under load (10 concurrent requests)."""
         print("\n" + "="*60)
-        print("LOAD TEST: List Templates (10 requests)")
+        print("LOAD TEST: List Templates (10 concurrent requests)")
         print("="*60)
         
-        durations = []
-        for i in range(10):
-            start = time.time()
-            response = client.get("/api/v1/template?skip=0&limit=10")
-            duration = time.time() - start
-            durations.append(duration)
-            
-            assert response.status_code == 200
-            print(f"Request {i+1:2d}: {duration*1000:6.0f}ms")
+        start = time.perf_counter_ns()
+        results = await asyncio.gather(*[
+            timed_request(aclient.get("/api/v1/template?skip=0&limit=10")) for _ in range(10)
+        ])
+        wall_ns = time.perf_counter_ns() - start
         
-        avg = statistics.mean(durations) * 1000
-        min_d = min(durations) * 1000
-        max_d = max(durations) * 1000
+        for i, (response, duration) in enumerate(results):
+            assert response.status_code == 200
+            print(f"Request {i+1:2d}: {duration / 1e6:8.2f}ms")
         
-        print("-"*60)
-        print(f"Average: {avg:.0f}ms | Min: {min_d:.0f}ms | Max: {max_d:.0f}ms")
-        print("="*60)
+        self._report([duration for _, duration in results], wall_ns)
     
-    def test_load_generate_draft(self, client: TestClient, sample_template: Template):
-        """Test draft generation under load (5 sequential requests)."""
+    @pytest.mark.asyncio
+    async def test_load_generate_draft(self, aclient: httpx.AsyncClient, sample_template: Template):
+        """Test draft generation under load (5 concurrent requests)."""
         print("\n" + "="*60)
-        print("LOAD TEST: Generate Draft (5 requests)")
+        print("LOAD TEST: Generate Draft (5 concurrent requests)")
         print("="*60)
         
         payload = {
@@ -169,23 +234,17 @@ class TestLoadTesting:
             "user_query": "Create a service agreement"
         }
         
-        durations = []
-        for i in range(5):
-            start = time.time()
-            response = client.post("/api/v1/draft/generate", json=payload)
-            duration = time.time() - start
-            durations.append(duration)
-            
-            assert response.status_code == 200
-            print(f"Request {i+1}: {duration*1000:6.0f}ms")
+        start = time.perf_counter_ns()
+        results = await asyncio.gather(*[
+            timed_request(aclient.post("/api/v1/draft/generate", json=payload)) for _ in range(5)
+        ])
+        wall_ns = time.perf_counter_ns() - start
         
-        avg = statistics.mean(durations) * 1000
-        min_d = min(durations) * 1000
-        max_d = max(durations) * 1000
+        for i, (response, duration) in enumerate(results):
+            assert response.status_code == 200
+            print(f"Request {i+1}: {duration / 1e6:8.2f}ms")
         
-        print("-"*60)
-        print(f"Average: {avg:.0f}ms | Min: {min_d:.0f}ms | Max: {max_d:.0f}ms")
-        print("="*60)
+        self._report([duration for _, duration in results], wall_ns)
 
 
 class TestDatabasePerformance:
@@ -200,28 +259,47 @@ class TestDatabasePerformance:
         print("="*60)
         
         # Test 1: Query all templates
-        start = time.time()
+        db.expire_all()  # Rows from earlier queries would otherwise skip re-hydration
+        start = time.perf_counter_ns()
         templates = db.query(Template).all()
-        duration = (time.time() - start) * 1000
+        duration = (time.perf_counter_ns() - start) / 1e6
         print(f"Query all templates: {duration:.2f}ms ({len(templates)} results)")
         
-        # Test 2: Query by template_id
-        start = time.time()
+        # Test 2: Query by template_id (unique index, so an index point lookup)
+        db.expire_all()
+        start = time.perf_counter_ns()
         template = db.query(Template).filter(
             Template.template_id == sample_template.template_id
         ).first()
-        duration = (time.time() - start) * 1000
+        duration = (time.perf_counter_ns() - start) / 1e6
         print(f"Query by template_id: {duration:.2f}ms")
         
         # Test 3: Query with pagination
-        start = time.time()
+        db.expire_all()
+        start = time.perf_counter_ns()
         templates = db.query(Template).offset(0).limit(10).all()
-        duration = (time.time() - start) * 1000
+        duration = (time.perf_counter_ns() - start) / 1e6
         print(f"Query with pagination (10): {duration:.2f}ms")
         
         print("="*60)
 
 
+@pytest.mark.unit
+class TestPromptSize:
+    """Guard against prompt bloat - every static prompt token is billed on each Gemini call."""
+    
+    # ~4 characters per token; keeps the template body instructions under ~1500 tokens
+    TEMPLATE_BODY_MAX_CHARS = 6000
+    
+    def test_template_body_prompt_size(self):
+        """Static instructions of the template body prompt stay within budget."""
+        from app.services.prompts import LegalDocumentPrompts
+        
+        size = len(LegalDocumentPrompts.TEMPLATE_BODY_PREAMBLE)
+        print(f"\nTemplate body preamble: {size} chars (~{size // 4} tokens)")
+        assert size <= self.TEMPLATE_BODY_MAX_CHARS
+
+
 @pytest.fixture(scope="session", autouse=True)
 def performance_report():
     """Print performance report after all tests."""
@@ -0,0 +1,701 @@
+"""
+Unit tests for the local (non-LLM) algorithms in the service layer.
+
+These need neither the database nor the Gemini API.
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import gemini_service, response_cache
+from app.services.gemini_service import (
+    GeminiService,
+    MATCH_LOCAL_MARGIN,
+    MATCH_LOCAL_THRESHOLD,
+    _local_match_accepted,
+    _JsonStreamTracker,
+    _json_loads,
+    _lexical_shortlist,
+    _local_match_ranking,
+    _loop_semaphore,
+    _run_sync,
+    _TokenBucket,
+)
+from app.services import template_generator
+from app.services.response_cache import ResponseCache
+from app.services.template_generator import TemplateGenerator, _uuid7
+
+# Taken before the autouse mock_gemini fixture replaces them
+_REAL_ACALL = GeminiService._acall
+_REAL_GENERATE_TEXT = GeminiService._generate_text
+
+
+def _template(template_id: str, title: str, doc_type: str, tags: list) -> dict:
+    return {
+        "template_id": template_id,
+        "title": title,
+        "file_description": "",
+        "doc_type": doc_type,
+        "jurisdiction": "US",
+        "similarity_tags": tags
+    }
+
+
+MATCH_CATALOG = [
+    _template("t1", "Employment Agreement", "employment", ["employment", "hiring", "salary"]),
+    _template("t2", "Non-Disclosure Agreement", "nda", ["confidentiality", "nda", "trade secrets"]),
+    _template("t3", "Service Level Agreement", "sla", ["uptime", "service credits", "support"]),
+    _template("t4", "Residential Lease Agreement", "lease", ["rent", "tenant", "landlord"]),
+    _template("t5", "Software License Agreement", "license", ["software", "license", "subscription"]),
+    _template("t6", "Purchase Agreement", "purchase", ["sale", "goods", "payment"]),
+    _template("t7", "Consulting Agreement", "consulting", ["consultant", "services", "fees"]),
+]
+
+
+@pytest.mark.unit
+class TestLocalMatchRanking:
+    """Local TF-IDF ranking that lets template matching skip the Gemini call."""
+    
+    @pytest.fixture(autouse=True)
+    def _requires_sklearn(self):
+        pytest.importorskip("sklearn")
+    
+    def test_distinct_match_is_accepted(self):
+        """A query that clearly names one template is answered locally."""
+        ranking = _local_match_ranking("tenant lease with rent", MATCH_CATALOG)
+        
+        assert ranking[0][1]["template_id"] == "t4"
+        assert ranking[0][0] >= MATCH_LOCAL_THRESHOLD
+        assert _local_match_accepted(ranking)
+    
+    def test_generic_query_falls_back(self):
+        """Words shared by every template score low, so Gemini decides."""
+        ranking = _local_match_ranking("agreement", MATCH_CATALOG)
+        
+        assert ranking[0][0] < MATCH_LOCAL_THRESHOLD
+        assert not _local_match_accepted(ranking)
+    
+    def test_unrelated_query_falls_back(self):
+        ranking = _local_match_ranking("website privacy policy", MATCH_CATALOG)
+        
+        assert not _local_match_accepted(ranking)
+    
+    def test_close_runner_up_falls_back(self):
+        """Two templates scoring alike are left to Gemini even above the threshold."""
+        catalog = MATCH_CATALOG + [
+            _template("t8", "Executive Employment Agreement", "employment", ["employment", "hiring", "executive"])
+        ]
+        ranking = _local_match_ranking("employment hiring", catalog)
+        
+        assert {ranking[0][1]["template_id"], ranking[1][1]["template_id"]} == {"t1", "t8"}
+        assert ranking[0][0] >= MATCH_LOCAL_THRESHOLD
+        assert ranking[0][0] - ranking[1][0] < MATCH_LOCAL_MARGIN
+        assert not _local_match_accepted(ranking)
+    
+    def test_accept_thresholds(self):
+        top, other = MATCH_CATALOG[0], MATCH_CATALOG[1]
+        
+        assert _local_match_accepted([(MATCH_LOCAL_THRESHOLD, top)])
+        assert not _local_match_accepted([(MATCH_LOCAL_THRESHOLD - 0.01, top)])
+        assert _local_match_accepted([(0.9, top), (0.9 - MATCH_LOCAL_MARGIN, other)])
+        assert not _local_match_accepted([(0.9, top), (0.9 - MATCH_LOCAL_MARGIN / 2, other)])
+        assert not _local_match_accepted([])
+        assert not _local_match_accepted(None)
+    
+    def test_prepare_match_skips_gemini_on_local_match(self):
+        service = GeminiService.__new__(GeminiService)
+        
+        result, _, prompt, _ = service._prepare_match("tenant lease with rent", MATCH_CATALOG)
+        
+        assert prompt is None
+        assert result["found"] is True
+        assert result["top_match"]["template_id"] == "t4"
+    
+    def test_prepare_match_falls_back_to_gemini(self):
+        service = GeminiService.__new__(GeminiService)
+        
+        result, _, prompt, _ = service._prepare_match("website privacy policy", MATCH_CATALOG)
+        
+        assert result is None
+        assert prompt is not None
+
+
+@pytest.mark.unit
+class TestLexicalShortlist:
+    """Token-prefix prefilter applied before the catalog is sent to Gemini."""
+    
+    @staticmethod
+    def _ids(templates: list) -> list:
+        return [t["template_id"] for t in templates]
+    
+    def test_query_token_prefixes_template_token(self):
+        """A query token matches template tokens it prefixes ("employ" -> "employment")."""
+        assert self._ids(_lexical_shortlist("employ", MATCH_CATALOG, top_k=5)) == ["t1"]
+    
+    def test_template_token_prefixes_query_token(self):
+        """A query token matches template tokens that prefix it ("tenants" -> "tenant")."""
+        assert self._ids(_lexical_shortlist("tenants leases", MATCH_CATALOG, top_k=5)) == ["t4"]
+    
+    def test_short_template_stem_ignored(self):
+        """Template tokens under the minimum stem length don't match longer query tokens."""
+        assert self._ids(_lexical_shortlist("ndas", MATCH_CATALOG, top_k=5)) == self._ids(MATCH_CATALOG)
+    
+    def test_ranked_by_matching_tokens(self):
+        shortlist = _lexical_shortlist("software subscription services", MATCH_CATALOG, top_k=5)
+        
+        assert self._ids(shortlist)[0] == "t5"
+        assert set(self._ids(shortlist)) == {"t3", "t5", "t7"}
+    
+    def test_top_k(self):
+        shortlist = _lexical_shortlist("agreement", MATCH_CATALOG, top_k=3)
+        
+        assert len(shortlist) == 3
+    
+    def test_no_match_returns_every_template(self):
+        assert _lexical_shortlist("website privacy policy", MATCH_CATALOG, top_k=3) is MATCH_CATALOG
+
+
+class _FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeAsyncModel:
+    """Stands in for a GenerativeModel: fails `failures` times, then streams `reply`."""
+    
+    model_name = "fake-model"
+    
+    def __init__(self, reply: str, failures: int = 0):
+        self.reply = reply
+        self.failures = failures
+        self.calls = 0
+    
+    async def generate_content_async(self, contents, stream=True):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.calls <= self.failures:
+            raise RuntimeError("transient failure")
+        
+        async def _stream():
+            for part in (self.reply[:3], self.reply[3:]):
+                yield _FakeChunk(part)
+        return _stream()
+
+
+@pytest.mark.unit
+class TestAsyncCall:
+    """GeminiService._acall retries, in-flight coalescing and the shared semaphore."""
+    
+    @pytest.fixture(autouse=True)
+    def _no_backoff(self, monkeypatch):
+        monkeypatch.setattr(gemini_service.random, "uniform", lambda a, b: 0)
+        monkeypatch.setattr(gemini_service, "get_response_cache", lambda: None)
+    
+    @pytest.mark.asyncio
+    async def test_identical_prompts_share_one_request(self):
+        service = GeminiService.__new__(GeminiService)
+        service.model = _FakeAsyncModel('{"ok": true}')
+        
+        results = await asyncio.gather(*(_REAL_ACALL(service, "same prompt") for _ in range(3)))
+        
+        assert results == ['{"ok": true}'] * 3
+        assert service.model.calls == 1
+        assert not GeminiService._inflight
+    
+    @pytest.mark.asyncio
+    async def test_retry_resolves_waiters_once(self):
+        service = GeminiService.__new__(GeminiService)
+        service.model = _FakeAsyncModel('{"ok": true}', failures=1)
+        
+        results = await asyncio.gather(*(_REAL_ACALL(service, "retried prompt") for _ in range(2)))
+        
+        assert results == ['{"ok": true}'] * 2
+        assert service.model.calls == 2
+    
+    @pytest.mark.asyncio
+    async def test_failure_reaches_waiters(self, monkeypatch):
+        monkeypatch.setattr(gemini_service, "GEMINI_MAX_RETRIES", 0)
+        service = GeminiService.__new__(GeminiService)
+        service.model = _FakeAsyncModel("", failures=1)
+        
+        results = await asyncio.gather(
+            *(_REAL_ACALL(service, "failing prompt") for _ in range(2)), return_exceptions=True
+        )
+        
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert not GeminiService._inflight
+    
+    @pytest.mark.asyncio
+    async def test_semaphore_shared_per_loop(self):
+        assert _loop_semaphore() is _loop_semaphore()
+    
+    def test_run_sync_from_sync_code(self):
+        async def _answer():
+            return 42
+        
+        assert _run_sync(_answer()) == 42
+    
+    @pytest.mark.asyncio
+    async def test_run_sync_refuses_running_loop(self):
+        """Blocking the loop on a fan-out would stall every other request on it."""
+        async def _answer():
+            return 42
+        
+        with pytest.raises(RuntimeError, match="running event loop"):
+            _run_sync(_answer())
+        # Still usable from a worker thread
+        assert await asyncio.to_thread(_run_sync, _answer()) == 42
+    
+    @pytest.mark.asyncio
+    async def test_unparseable_json_response_not_cached(self, tmp_path, monkeypatch):
+        cache = ResponseCache(str(tmp_path / "responses.db"))
+        monkeypatch.setattr(gemini_service, "get_response_cache", lambda: cache)
+        service = GeminiService.__new__(GeminiService)
+        service.model = _FakeAsyncModel('{"ok": tr')
+        
+        await _REAL_ACALL(service, "truncated prompt", json_response=True)
+        service.model.reply = '{"ok": true}'
+        
+        assert await _REAL_ACALL(service, "truncated prompt", json_response=True) == '{"ok": true}'
+        assert service.model.calls == 2
+
+
+def _variable(key: str, example: str) -> dict:
+    return {"key": key, "label": key.replace("_", " ").title(), "example": example, "dtype": "string"}
+
+
+@pytest.mark.unit
+class TestTemplateReplacement:
+    """generate_template_from_text gives the same result with every matcher backend."""
+    
+    @pytest.fixture(params=["ahocorasick", "regex"])
+    def service(self, request, monkeypatch) -> GeminiService:
+        if request.param == "ahocorasick" and gemini_service.ahocorasick is None:
+            pytest.skip("pyahocorasick not installed")
+        if request.param == "regex":
+            monkeypatch.setattr(gemini_service, "ahocorasick", None)
+        return GeminiService.__new__(GeminiService)
+    
+    def test_replaces_every_occurrence_case_insensitively(self, service: GeminiService):
+        variables = [_variable("company_name", "Acme"), _variable("client_name", "Globex")]
+        
+        template = service.generate_template_from_text("Acme signed with GLOBEX; acme pays.", variables)
+        
+        assert template == "{{company_name}} signed with {{client_name}}; {{company_name}} pays."
+    
+    def test_whole_tokens_only(self, service: GeminiService):
+        variables = [_variable("city", "Springfield")]
+        
+        template = service.generate_template_from_text("Springfield, not Springfields or WestSpringfield.", variables)
+        
+        assert template == "{{city}}, not Springfields or WestSpringfield."
+    
+    def test_first_variable_wins_on_shared_example(self, service: GeminiService):
+        variables = [_variable("seller_name", "Acme"), _variable("buyer_name", "Acme")]
+        
+        assert service.generate_template_from_text("Sold by Acme.", variables) == "Sold by {{seller_name}}."
+    
+    def test_multi_word_examples_match_any_whitespace(self, service: GeminiService):
+        variables = [_variable("company_name", "Acme Corp"), _variable("amount", "$50,000")]
+        
+        template = service.generate_template_from_text("Acme\n  Corp owes $50,000 to ACME CORP.", variables)
+        
+        assert template == "{{company_name}} owes {{amount}} to {{company_name}}."
+    
+    def test_no_examples_returns_text(self, service: GeminiService):
+        variables = [_variable("company_name", "")]
+        
+        assert service.generate_template_from_text("Nothing to replace.", variables) == "Nothing to replace."
+
+
+def _feed_all(chunks: list) -> int:
+    """Feed chunks to a fresh tracker; returns the index of the chunk that completed the value, or -1."""
+    tracker = _JsonStreamTracker()
+    for index, chunk in enumerate(chunks):
+        if tracker.feed(chunk):
+            return index
+    return -1
+
+
+@pytest.mark.unit
+class TestJsonStreamTracker:
+    """Detecting the end of a streamed top-level JSON value."""
+    
+    def test_completes_on_closing_brace(self):
+        assert _feed_all(['{"a": [1, ', '2]}', ' trailing text']) == 1
+    
+    def test_incomplete_value(self):
+        assert _feed_all(['{"a": {"b": 1}', ', "c": 2']) == -1
+    
+    def test_value_after_leading_fence(self):
+        assert _feed_all(['  ```json\n', '[{"k": 1}]', '\n```']) == 1
+        assert _feed_all(['```\n{"k": 1}', '\n```']) == 0
+    
+    def test_leading_prose_reads_whole_response(self):
+        """A bracket in leading prose must not be taken for the value and end the stream early."""
+        assert _feed_all(['Here is the [result]: ', '{"k": [1]}', ' done']) == -1
+        assert _feed_all(['```json\nHere: ', '[{"k": 1}]', '\n```']) == -1
+        assert _feed_all(['Sure! ' * 20, '{"k": 1}']) == -1
+    
+    def test_brackets_inside_strings(self):
+        assert _feed_all(['{"body": "use {{key}} and [x]', ' or }"', '}']) == 2
+    
+    def test_escaped_quote_split_across_chunks(self):
+        # The backslash ends one chunk and the quote it escapes starts the next
+        assert _feed_all(['{"q": "say \\', '"hi\\" }', '"}']) == 2
+    
+    def test_escaped_backslash_before_quote(self):
+        assert _feed_all(['{"path": "C:\\\\"', '}']) == 1
+
+
+@pytest.mark.unit
+class TestJsonRepair:
+    """_json_loads recovers common LLM JSON malformations, with and without json_repair."""
+    
+    @pytest.fixture(params=["json_repair", "stdlib"], autouse=True)
+    def backend(self, request, monkeypatch) -> str:
+        if request.param == "json_repair" and gemini_service.json_repair is None:
+            pytest.skip("json_repair not installed")
+        if request.param == "stdlib":
+            monkeypatch.setattr(gemini_service, "json_repair", None)
+        return request.param
+    
+    def test_valid_json_unchanged(self):
+        assert _json_loads('{"a": [1, 2], "b": "{x}"}') == {"a": [1, 2], "b": "{x}"}
+    
+    def test_trailing_commas(self):
+        assert _json_loads('{"a": [1, 2,], "b": {"c": 3,},}') == {"a": [1, 2], "b": {"c": 3}}
+    
+    def test_prose_around_value(self):
+        assert _json_loads('Sure! Here it is: {"a": 1} Hope this helps.') == {"a": 1}
+    
+    def test_top_level_array(self):
+        assert _json_loads('Result:\n[{"key": "x"},]') == [{"key": "x"}]
+    
+    def test_unrepairable_raises_decode_error(self):
+        with pytest.raises(json.JSONDecodeError):
+            _json_loads("I could not process this document.")
+    
+    def test_truncated_value(self, backend: str):
+        if backend == "stdlib":
+            with pytest.raises(json.JSONDecodeError):
+                _json_loads('{"a": [1, 2')
+        else:
+            assert _json_loads('{"a": [1, 2') == {"a": [1, 2]}
+
+
+def _reference_render(body_md: str, answers: dict) -> str:
+    """The original render_draft: strip frontmatter, then str.replace each answered placeholder."""
+    draft = body_md
+    if body_md.startswith("---"):
+        parts = body_md.split("---", 2)
+        if len(parts) >= 3:
+            draft = parts[2].strip()
+    for key, value in answers.items():
+        placeholder = f"{{{{{key}}}}}"
+        if placeholder in draft:
+            draft = draft.replace(placeholder, str(value) if value is not None else "")
+    return draft
+
+
+RENDER_CASES = {
+    "plain": (
+        "---\ntemplate_id: t\n---\n\n# NDA\n\nBetween {{party_a}} and {{party_b}}, dated {{date}}.",
+        {"party_a": "Acme Corp", "party_b": "Globex", "date": "2024-01-15"}
+    ),
+    "repeated and unanswered": (
+        "{{name}} agrees. Signed: {{name}}. Witness: {{witness}}.",
+        {"name": "Jane Doe"}
+    ),
+    "literal braces": (
+        "Use {curly} and {{{{double}}}} braces, JSON {\"a\": 1}, and {{name}}} here.",
+        {"name": "Jane", "double": "x"}
+    ),
+    "numeric keys": (
+        "Item {{1}} costs {{2}}; total {{amount}}.",
+        {"1": "widget", "2": "$5", "amount": "$10"}
+    ),
+    "values with braces and None": (
+        "Note: {{note}}; empty: [{{empty}}]; number: {{count}}.",
+        {"note": "{literal} {{not_a_key}}", "empty": None, "count": 3}
+    ),
+    "horizontal rules after frontmatter": (
+        "---\ntitle: x\n---\n# Terms\n\n---\n\n{{clause}}\n\n---",
+        {"clause": "Fees are due monthly."}
+    ),
+    "no placeholders": (
+        "Static text with {braces} only.",
+        {"unused": "value"}
+    ),
+}
+
+
+@pytest.mark.unit
+class TestRenderDraft:
+    """format_map rendering matches the original replace-based renderer."""
+    
+    @pytest.mark.parametrize("body_md, answers", list(RENDER_CASES.values()), ids=list(RENDER_CASES))
+    def test_matches_reference_renderer(self, body_md: str, answers: dict):
+        generator = TemplateGenerator.__new__(TemplateGenerator)
+        template = SimpleNamespace(template_id="tpl_render_test", body_md=body_md)
+        
+        assert generator.render_draft(template, answers) == _reference_render(body_md, answers)
+    
+    def test_repeated_renders_use_fresh_answers(self):
+        generator = TemplateGenerator.__new__(TemplateGenerator)
+        template = SimpleNamespace(template_id="tpl_render_test", body_md="Hello {{name}}, {x}")
+        
+        assert generator.render_draft(template, {"name": "Ann"}) == "Hello Ann, {x}"
+        assert generator.render_draft(template, {"name": "Bob"}) == "Hello Bob, {x}"
+        assert generator.render_draft(template, {}) == "Hello {{name}}, {x}"
+
+
+@pytest.mark.unit
+class TestUuid7:
+    """Time-ordered template ids."""
+    
+    def test_version_and_variant(self):
+        value = _uuid7()
+        
+        assert value.version == 7
+        assert value.variant == "specified in RFC 4122"
+    
+    def test_embeds_unix_milliseconds(self, monkeypatch):
+        monkeypatch.setattr(template_generator.time, "time_ns", lambda: 1_700_000_000_123_456_789)
+        
+        assert _uuid7().int >> 80 == 1_700_000_000_123
+    
+    def test_later_ids_sort_after_earlier_ones(self, monkeypatch):
+        clock = iter(range(1_700_000_000_000_000_000, 1_700_000_000_100_000_000, 1_000_000))
+        monkeypatch.setattr(template_generator.time, "time_ns", lambda: next(clock))
+        
+        ids = [str(_uuid7()) for _ in range(50)]
+        
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(ids)
+
+
+@pytest.mark.unit
+class TestResponseCache:
+    """SQLite-backed LLM response cache."""
+    
+    @pytest.fixture
+    def clock(self, monkeypatch) -> SimpleNamespace:
+        clock = SimpleNamespace(now=1_000_000.0)
+        monkeypatch.setattr(response_cache.time, "time", lambda: clock.now)
+        return clock
+    
+    def test_round_trip(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "responses.db"))
+        
+        cache.set("key", '{"a": 1}')
+        
+        assert cache.get("key") == '{"a": 1}'
+        assert cache.get("missing") is None
+    
+    def test_shared_across_instances(self, tmp_path):
+        path = str(tmp_path / "responses.db")
+        ResponseCache(path).set("key", "value")
+        
+        assert ResponseCache(path).get("key") == "value"
+    
+    def test_entries_expire_after_ttl(self, tmp_path, clock):
+        cache = ResponseCache(str(tmp_path / "responses.db"), ttl_seconds=60)
+        cache.set("key", "value")
+        
+        clock.now += 60
+        assert cache.get("key") == "value"
+        clock.now += 1
+        assert cache.get("key") is None
+        # Expired rows are deleted, not just hidden
+        clock.now -= 61
+        assert cache.get("key") is None
+    
+    def test_evicts_least_recently_used(self, tmp_path, clock):
+        cache = ResponseCache(str(tmp_path / "responses.db"), max_entries=2)
+        cache.set("kept", "value")
+        for i in range(response_cache._EVICT_EVERY - 2):
+            clock.now += 1
+            cache.set(f"filler-{i}", "value")
+        clock.now += 1
+        assert cache.get("kept") == "value"  # refreshes its access time
+        clock.now += 1
+        cache.set("newest", "value")  # this write triggers the eviction pass
+        
+        assert cache.get("kept") == "value"
+        assert cache.get("newest") == "value"
+        assert cache.get("filler-0") is None
+
+
+class _FakeSyncModel:
+    """Stands in for a GenerativeModel on the sync path, counting requests."""
+    
+    model_name = "fake-model"
+    
+    def __init__(self, reply: str):
+        self.reply = reply
+        self.calls = 0
+    
+    def generate_content(self, contents, stream=True):
+        self.calls += 1
+        time.sleep(0.05)
+        return iter([_FakeChunk(self.reply)])
+
+
+@pytest.mark.unit
+class TestRequestCoalescing:
+    """Identical Gemini requests are sent once, then served from the response cache."""
+    
+    def test_concurrent_identical_requests_share_one_call(self, monkeypatch):
+        monkeypatch.setattr(gemini_service, "get_response_cache", lambda: None)
+        service = GeminiService.__new__(GeminiService)
+        service.model = _FakeSyncModel('{"ok": true}')
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: _REAL_GENERATE_TEXT(service, "same prompt"), range(4)))
+        
+        assert results == ['{"ok": true}'] * 4
+        assert service.model.calls == 1
+        assert not GeminiService._inflight
+    
+    def test_repeat_request_served_from_response_cache(self, tmp_path, monkeypatch):
+        cache = ResponseCache(str(tmp_path / "responses.db"))
+        monkeypatch.setattr(gemini_service, "get_response_cache", lambda: cache)
+        service = GeminiService.__new__(GeminiService)
+        service.model = _FakeSyncModel('{"ok": true}')
+        
+        first = _REAL_GENERATE_TEXT(service, "cached prompt")
+        second = _REAL_GENERATE_TEXT(service, "cached prompt")
+        
+        assert first == second == '{"ok": true}'
+        assert service.model.calls == 1
+    
+    def test_unparseable_json_response_not_cached(self, tmp_path, monkeypatch):
+        """A truncated JSON generation is re-requested rather than replayed from disk."""
+        cache = ResponseCache(str(tmp_path / "responses.db"))
+        monkeypatch.setattr(gemini_service, "get_response_cache", lambda: cache)
+        service = GeminiService.__new__(GeminiService)
+        service.model = _FakeSyncModel('{"ok": tr')
+        
+        _REAL_GENERATE_TEXT(service, "truncated prompt", json_response=True)
+        service.model.reply = '{"ok": true}'
+        retried = _REAL_GENERATE_TEXT(service, "truncated prompt", json_response=True)
+        
+        assert retried == '{"ok": true}'
+        assert service.model.calls == 2
+        assert _REAL_GENERATE_TEXT(service, "truncated prompt", json_response=True) == '{"ok": true}'
+        assert service.model.calls == 2
+    
+    def test_fenced_json_response_cached(self, tmp_path, monkeypatch):
+        cache = ResponseCache(str(tmp_path / "responses.db"))
+        monkeypatch.setattr(gemini_service, "get_response_cache", lambda: cache)
+        service = GeminiService.__new__(GeminiService)
+        service.model = _FakeSyncModel('```json\n{"ok": true}\n```')
+        
+        _REAL_GENERATE_TEXT(service, "fenced prompt", json_response=True)
+        _REAL_GENERATE_TEXT(service, "fenced prompt", json_response=True)
+        
+        assert service.model.calls == 1
+
+
+@pytest.mark.unit
+class TestTokenBucket:
+    """Client-side rate limiting of Gemini requests."""
+    
+    @pytest.fixture
+    def clock(self, monkeypatch) -> SimpleNamespace:
+        clock = SimpleNamespace(now=100.0)
+        monkeypatch.setattr(gemini_service.time, "monotonic", lambda: clock.now)
+        return clock
+    
+    def test_burst_up_to_capacity(self, clock):
+        bucket = _TokenBucket(60)  # one per second
+        
+        assert [bucket.reserve() for _ in range(60)] == [0.0] * 60
+        assert bucket.reserve() == pytest.approx(1.0)
+    
+    def test_waiting_callers_queue_up(self, clock):
+        bucket = _TokenBucket(60)
+        bucket.reserve(60)
+        
+        assert [bucket.reserve() for _ in range(3)] == pytest.approx([1.0, 2.0, 3.0])
+    
+    def test_refills_over_time(self, clock):
+        bucket = _TokenBucket(60)
+        bucket.reserve(60)
+        
+        clock.now += 10
+        assert [bucket.reserve() for _ in range(10)] == [0.0] * 10
+        assert bucket.reserve() > 0
+    
+    def test_refill_capped_at_capacity(self, clock):
+        bucket = _TokenBucket(60)
+        
+        clock.now += 3600
+        assert [bucket.reserve() for _ in range(60)] == [0.0] * 60
+        assert bucket.reserve() > 0
+    
+    def test_oversized_request_costs_at_most_capacity(self, clock):
+        bucket = _TokenBucket(1000)
+        
+        assert bucket.reserve(5000) == 0.0
+        assert bucket.reserve(1) == pytest.approx(0.06)
+
+
+def _typed_variable(key: str, dtype: str) -> dict:
+    return {"key": key, "label": key.replace("_", " ").title(), "dtype": dtype, "required": False}
+
+
+@pytest.mark.unit
+class TestLocalPrefill:
+    """Regex prefill of dates, emails, phone numbers and amounts before Gemini is asked."""
+    
+    VARIABLES = [
+        _typed_variable("effective_date", "date"),
+        _typed_variable("contact_email", "email"),
+        _typed_variable("contact_phone", "phone"),
+        _typed_variable("fee", "currency"),
+        _typed_variable("company_name", "string"),
+    ]
+    
+    def test_extracts_each_dtype(self):
+        query = "Starting 2024-03-01, pay $12,500.50 to jane.doe@acme.co.uk or call +1 415 555 0100 for Acme."
+        
+        assert GeminiService._extract_prefill_locally(query, self.VARIABLES) == {
+            "effective_date": "2024-03-01",
+            "contact_email": "jane.doe@acme.co.uk",
+            "contact_phone": "+1 415 555 0100",
+            "fee": "12500.50",
+        }
+    
+    def test_repeated_value_is_not_ambiguous(self):
+        query = "Effective 2024-03-01 (that is, 2024-03-01)."
+        
+        assert GeminiService._extract_prefill_locally(query, self.VARIABLES) == {"effective_date": "2024-03-01"}
+    
+    def test_distinct_values_left_for_llm(self):
+        query = "Runs from 2024-03-01 to 2025-03-01, fee $100 or $200."
+        
+        assert GeminiService._extract_prefill_locally(query, self.VARIABLES) == {}
+    
+    def test_several_variables_of_dtype_left_for_llm(self):
+        variables = [_typed_variable("start_date", "date"), _typed_variable("end_date", "date")]
+        
+        assert GeminiService._extract_prefill_locally("Starts 2024-03-01.", variables) == {}
+    
+    def test_short_digit_runs_are_not_phones(self):
+        query = "Call extension 555 0100 about clause 12."
+        
+        assert GeminiService._extract_prefill_locally(query, self.VARIABLES) == {}
+    
+    def test_prepare_prefill_asks_only_for_the_rest(self):
+        service = GeminiService.__new__(GeminiService)
+        
+        local_result, remaining = service._prepare_prefill("Acme, effective 2024-03-01.", self.VARIABLES)
+        
+        assert set(local_result) == {"effective_date"}
+        assert [v["key"] for v in remaining] == ["contact_email", "contact_phone", "fee", "company_name"]